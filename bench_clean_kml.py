@@ -0,0 +1,83 @@
+import random
+import time
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import Point
+
+from testing3 import clean_kml_data
+
+
+# Row-by-row reference: the previous iterrows/concat loop with the overlap rule
+# applied as clean_kml_data applies it, one pairwise difference at a time
+def clean_kml_data_rowwise(kml_data):
+    risk_priority = {
+        'Low risk': 6,
+        'Slight risk': 5,
+        'Enhanced risk': 4,
+        'Moderate risk': 3,
+        'High risk': 2,
+    }
+    kml_data['priority'] = kml_data['Name'].map(risk_priority).fillna(0)
+    kml_data = kml_data.sort_values(by='priority', ascending=False)
+    cleaned_gdf = gpd.GeoDataFrame(columns=kml_data.columns, crs=kml_data.crs)
+    for idx, row in kml_data.iterrows():
+        current_geom = row['geometry']
+        if row['priority'] > 0:
+            for _, other_row in kml_data.iterrows():
+                if 0 < other_row['priority'] < row['priority']:
+                    current_geom = current_geom.difference(other_row['geometry'])
+        if not current_geom.is_empty:
+            new_row = gpd.GeoDataFrame([row.drop('geometry').to_dict() | {'geometry': current_geom}], crs=kml_data.crs)
+            cleaned_gdf = pd.concat([cleaned_gdf, new_row], ignore_index=True)
+    return cleaned_gdf
+
+# Tiers are drawn as nested storm areas, as on a real outlook, so every tier
+# below High risk has area to lose
+def make_outlook(n_risk_of, n_areas=4, seed=0):
+    rng = random.Random(seed)
+    names = ['Low risk', 'Slight risk', 'Enhanced risk', 'Moderate risk', 'High risk']
+    rows = []
+    for _ in range(n_areas):
+        x, y, radius = rng.uniform(-8, 2), rng.uniform(50, 58), rng.uniform(1.5, 3.0)
+        for name in names:
+            rows.append({'Name': name, 'Description': '', 'geometry': Point(x, y).buffer(radius, 64)})
+            x, y, radius = x + rng.uniform(-0.2, 0.2) * radius, y + rng.uniform(-0.2, 0.2) * radius, radius * 0.6
+    for _ in range(n_risk_of):
+        rows.append({'Name': 'Risk of severe thunderstorms', 'Description': '',
+                     'geometry': Point(rng.uniform(-8, 2), rng.uniform(50, 58)).buffer(rng.uniform(0.2, 1.0), 64)})
+    gdf = gpd.GeoDataFrame(rows, crs="EPSG:4326")
+    gdf['discussion'] = "No discussion available."
+    return gdf
+
+# One union-then-difference does not round exactly like a chain of pairwise
+# differences, so geometries are compared by the area they disagree on
+def same_output(reference, cleaned, tolerance=1e-9):
+    if list(reference['Name']) != list(cleaned['Name']):
+        return False
+    return all(a.symmetric_difference(b).area <= tolerance * max(a.area, 1.0)
+               for a, b in zip(reference['geometry'], cleaned['geometry']))
+
+def run_benchmark(sizes=(10, 50, 200, 500), repeats=3):
+    print(f"{'risk of':>8} {'removed (deg2)':>15} {'row-wise (s)':>13} {'new (s)':>10} {'speedup':>8}")
+    for n in sizes:
+        outlook = make_outlook(n)
+        reference = clean_kml_data_rowwise(outlook.copy())
+        cleaned = clean_kml_data(outlook.copy())
+        assert same_output(reference, cleaned)
+        # Area the overlap rule removed, so the timings are known to cover the subtraction
+        removed = outlook.geometry.area.sum() - cleaned.geometry.area.sum()
+        assert removed > 0
+        timings = []
+        for func in (clean_kml_data_rowwise, clean_kml_data):
+            best = float('inf')
+            for _ in range(repeats):
+                data = outlook.copy()
+                t0 = time.perf_counter()
+                func(data)
+                best = min(best, time.perf_counter() - t0)
+            timings.append(best)
+        print(f"{n:>8} {removed:>15.2f} {timings[0]:>13.4f} {timings[1]:>10.4f} {timings[0] / timings[1]:>7.1f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
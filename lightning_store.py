@@ -0,0 +1,338 @@
+import json
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+
+
+# Compact Binary Lightning Strike Store
+# Layout (all little-endian, every column 4-byte aligned so the browser can view
+# it directly with typed arrays):
+#   0  magic  b'STRK'
+#   4  uint32 format version
+#   8  uint32 strike count (n)
+#   12 uint32 reserved
+#   16 uint32[n] strike time, epoch seconds UTC
+#   .. int32[n]  latitude  * 1e5
+#   .. int32[n]  longitude * 1e5
+STRIKE_MAGIC = b'STRK'
+STRIKE_FORMAT_VERSION = 1
+STRIKE_HEADER = struct.Struct('<4sIII')
+COORD_SCALE = 100000
+
+
+def strike_epoch(time_str):
+    # Scraped times are naive ISO strings in UTC
+    parsed = datetime.fromisoformat(time_str)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def epoch_to_iso(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+# Strikes are handled internally as (epoch, lat * 1e5, lon * 1e5) integer tuples,
+# which also makes exact de-duplication straightforward
+def strike_record(strike):
+    return (strike_epoch(strike['time']), round(strike['lat'] * COORD_SCALE), round(strike['lon'] * COORD_SCALE))
+
+def record_to_strike(record):
+    epoch, lat, lon = record
+    return {'lat': lat / COORD_SCALE, 'lon': lon / COORD_SCALE, 'time': epoch_to_iso(epoch)}
+
+# Sorted by time with epoch milliseconds alongside, so the map page can find a
+# time window by binary search without parsing every time string. Coordinates
+# are quantized like the binary files so the page can match strikes across them.
+def time_indexed_strikes(strikes):
+    indexed = [{'lat': round(strike['lat'] * COORD_SCALE) / COORD_SCALE, 'lon': round(strike['lon'] * COORD_SCALE) / COORD_SCALE,
+                'time': strike['time'], 'ms': strike_epoch(strike['time']) * 1000}
+               for strike in strikes]
+    indexed.sort(key=lambda strike: strike['ms'])
+    return indexed
+
+def records_to_binary(records):
+    count = len(records)
+    return (STRIKE_HEADER.pack(STRIKE_MAGIC, STRIKE_FORMAT_VERSION, count, 0) +
+            struct.pack(f'<{count}I', *(r[0] for r in records)) +
+            struct.pack(f'<{count}i', *(r[1] for r in records)) +
+            struct.pack(f'<{count}i', *(r[2] for r in records)))
+
+def records_from_binary(data):
+    magic, version, count, _ = STRIKE_HEADER.unpack_from(data, 0)
+    if magic != STRIKE_MAGIC or version != STRIKE_FORMAT_VERSION:
+        raise ValueError(f"Not a version {STRIKE_FORMAT_VERSION} strike file")
+    offset = STRIKE_HEADER.size
+    times = struct.unpack_from(f'<{count}I', data, offset)
+    lats = struct.unpack_from(f'<{count}i', data, offset + 4 * count)
+    lons = struct.unpack_from(f'<{count}i', data, offset + 8 * count)
+    return list(zip(times, lats, lons))
+
+def strikes_to_binary(strikes):
+    return records_to_binary([strike_record(strike) for strike in strikes])
+
+def strikes_from_binary(data):
+    return [record_to_strike(record) for record in records_from_binary(data)]
+
+def write_strikes_binary(strikes, output_path):
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(strikes_to_binary(strikes))
+    os.replace(tmp_path, output_path)
+
+def read_strikes_binary(input_path):
+    with open(input_path, 'rb') as f:
+        return strikes_from_binary(f.read())
+
+def pack_strikes_file(json_path, binary_path):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        strikes = json.load(f)
+    write_strikes_binary(strikes, binary_path)
+    return len(strikes)
+
+# Time-Partitioned Lightning Archive
+# Strikes are kept in hourly or daily chunk files (same binary format, sorted by
+# time) listed in manifest.json with each chunk's time range and strike count.
+# Ingest only ever adds strikes, so the page can fetch just the chunks that
+# overlap its time window and keep the ones it already has.
+PARTITION_SECONDS = {'hour': 3600, 'day': 86400}
+
+def load_manifest(archive_dir, partition='day'):
+    manifest_path = os.path.join(archive_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'version': 1, 'partition': partition, 'chunks': {}}
+
+def save_manifest(archive_dir, manifest):
+    manifest_path = os.path.join(archive_dir, "manifest.json")
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def chunk_key(epoch, partition):
+    chunk_start = epoch - epoch % PARTITION_SECONDS[partition]
+    fmt = '%Y-%m-%dT%H' if partition == 'hour' else '%Y-%m-%d'
+    return datetime.fromtimestamp(chunk_start, tz=timezone.utc).strftime(fmt), chunk_start
+
+def read_chunk(archive_dir, chunk):
+    with open(os.path.join(archive_dir, chunk['file']), 'rb') as f:
+        return records_from_binary(f.read())
+
+def ingest_strikes(archive_dir, strikes, partition='day'):
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = load_manifest(archive_dir, partition)
+    partition = manifest['partition']
+    by_chunk = {}
+    for strike in strikes:
+        record = strike_record(strike)
+        key, chunk_start = chunk_key(record[0], partition)
+        by_chunk.setdefault((key, chunk_start), set()).add(record)
+
+    added = 0
+    for (key, chunk_start), records in by_chunk.items():
+        chunk = manifest['chunks'].get(key)
+        existing = set(read_chunk(archive_dir, chunk)) if chunk else set()
+        new_records = records - existing
+        if not new_records:
+            continue
+        merged = sorted(existing | new_records)
+        file_name = f"{key}.bin"
+        tmp_path = os.path.join(archive_dir, file_name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(records_to_binary(merged))
+        os.replace(tmp_path, os.path.join(archive_dir, file_name))
+        manifest['chunks'][key] = {
+            'file': file_name,
+            'start': chunk_start,
+            'end': chunk_start + PARTITION_SECONDS[partition] - 1,
+            'count': len(merged),
+        }
+        added += len(new_records)
+    # Saved last so readers never see a manifest pointing at unwritten data
+    save_manifest(archive_dir, manifest)
+    return added
+
+# Naive datetimes are UTC, like the scraped time strings
+def to_epoch(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    return int(value)
+
+def query_strikes(archive_dir, start, end):
+    start_epoch = to_epoch(start)
+    end_epoch = to_epoch(end)
+    manifest = load_manifest(archive_dir)
+    strikes = []
+    for key in sorted(manifest['chunks']):
+        chunk = manifest['chunks'][key]
+        if chunk['end'] < start_epoch or chunk['start'] > end_epoch:
+            continue
+        strikes.extend(record_to_strike(r) for r in read_chunk(archive_dir, chunk) if start_epoch <= r[0] <= end_epoch)
+    return strikes
+
+def ingest_strikes_file(json_path, archive_dir, partition='day'):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return ingest_strikes(archive_dir, json.load(f), partition)
+
+# Lightning Density Grids
+# Strike counts per lat/lon cell for each UTC day at several resolutions, so long
+# windows (months, years) can be drawn as a density surface instead of as
+# individual strikes. Cells are numbered row-major from (-90, -180) with
+# 360 / resolution columns, and each day file lists only its non-empty cells.
+DENSITY_RESOLUTIONS = (0.5, 0.1, 0.02)
+
+def density_grid(records, resolution):
+    step = round(resolution * COORD_SCALE)
+    columns = round(360 / resolution)
+    counts = {}
+    for _, lat, lon in records:
+        cell = (lat + 90 * COORD_SCALE) // step * columns + (lon + 180 * COORD_SCALE) // step
+        counts[cell] = counts.get(cell, 0) + 1
+    cells = sorted(counts)
+    return {'cells': cells, 'counts': [counts[cell] for cell in cells]}
+
+def load_density_manifest(density_dir, resolutions=DENSITY_RESOLUTIONS):
+    manifest_path = os.path.join(density_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        # A change of resolutions invalidates every day file
+        if manifest['resolutions'] == list(resolutions):
+            return manifest
+    return {'version': 1, 'resolutions': list(resolutions), 'days': {}}
+
+def publish_density(density_dir, records_by_day, resolutions=DENSITY_RESOLUTIONS):
+    os.makedirs(density_dir, exist_ok=True)
+    manifest = load_density_manifest(density_dir, resolutions)
+    rebuilt = 0
+    for day, records in records_by_day.items():
+        entry = manifest['days'].get(day)
+        if entry and entry['count'] == len(records):
+            continue
+        file_name = f"{day}.json"
+        grids = {str(resolution): density_grid(records, resolution) for resolution in resolutions}
+        tmp_path = os.path.join(density_dir, file_name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'day': day, 'count': len(records), 'grids': grids}, f, separators=(',', ':'))
+        os.replace(tmp_path, os.path.join(density_dir, file_name))
+        day_start = int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+        manifest['days'][day] = {'file': file_name, 'start': day_start, 'end': day_start + 86399, 'count': len(records)}
+        rebuilt += 1
+    save_manifest(density_dir, manifest)
+    return rebuilt
+
+# Only days whose archived strike count has changed are re-read and re-binned
+def density_from_archive(archive_dir, density_dir, resolutions=DENSITY_RESOLUTIONS):
+    archive = load_manifest(archive_dir)
+    known = load_density_manifest(density_dir, resolutions)['days']
+    day_chunks = {}
+    for chunk in archive['chunks'].values():
+        day, _ = chunk_key(chunk['start'], 'day')
+        day_chunks.setdefault(day, []).append(chunk)
+    records_by_day = {}
+    for day, chunks in day_chunks.items():
+        if known.get(day, {}).get('count') != sum(chunk['count'] for chunk in chunks):
+            records_by_day[day] = [record for chunk in chunks for record in read_chunk(archive_dir, chunk)]
+    return publish_density(density_dir, records_by_day, resolutions)
+
+# Each day present is rebuilt from these strikes alone, so prefer the archive for
+# days the live feed only partly covers
+def density_from_strikes(strikes, density_dir, resolutions=DENSITY_RESOLUTIONS):
+    records_by_day = {}
+    for record in {strike_record(strike) for strike in strikes}:
+        day, _ = chunk_key(record[0], 'day')
+        records_by_day.setdefault(day, []).append(record)
+    return publish_density(density_dir, records_by_day, resolutions)
+
+def publish_density_source(source, density_dir):
+    if os.path.isdir(source):
+        return density_from_archive(source, density_dir)
+    with open(source, 'r', encoding='utf-8') as f:
+        return density_from_strikes(json.load(f), density_dir)
+
+# Incremental Lightning Feed
+# Each publish that finds new strikes bumps the sequence number and writes a small
+# delta file with just those strikes. feed.json lists the recent deltas and a full
+# snapshot tagged with its sequence, so a client that has missed deltas (or has
+# none) can resynchronise from the snapshot and continue from there.
+def load_feed(feed_dir):
+    feed_path = os.path.join(feed_dir, "feed.json")
+    if os.path.exists(feed_path):
+        with open(feed_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'version': 1, 'sequence': 0, 'snapshot': None, 'snapshot_sequence': 0, 'deltas': {}}
+
+def write_feed_file(feed_dir, file_name, records):
+    tmp_path = os.path.join(feed_dir, file_name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(records_to_binary(records))
+    os.replace(tmp_path, os.path.join(feed_dir, file_name))
+
+def publish_feed(feed_dir, strikes, keep_deltas=120):
+    os.makedirs(feed_dir, exist_ok=True)
+    feed = load_feed(feed_dir)
+    current = sorted({strike_record(strike) for strike in strikes})
+    previous = set()
+    if feed['snapshot'] and os.path.exists(os.path.join(feed_dir, feed['snapshot'])):
+        with open(os.path.join(feed_dir, feed['snapshot']), 'rb') as f:
+            previous = set(records_from_binary(f.read()))
+    added = [record for record in current if record not in previous]
+    if not added and set(current) == previous and feed['snapshot'] and 'live_start' in feed:
+        return 0
+
+    if added:
+        feed['sequence'] += 1
+        delta_file = f"delta-{feed['sequence']}.bin"
+        write_feed_file(feed_dir, delta_file, added)
+        feed['deltas'][str(feed['sequence'])] = delta_file
+    # Snapshots are named by sequence so feed.json never points at a newer file
+    # than it describes while the two are being replaced
+    old_snapshot = feed['snapshot']
+    snapshot_file = f"snapshot-{feed['sequence']}.bin"
+    write_feed_file(feed_dir, snapshot_file, current)
+    feed['snapshot'] = snapshot_file
+    feed['snapshot_sequence'] = feed['sequence']
+    # Oldest strike still live, so clients can drop what the producer has dropped
+    feed['live_start'] = current[0][0] if current else None
+
+    expired = sorted(feed['deltas'], key=int)[:-keep_deltas] if len(feed['deltas']) > keep_deltas else []
+    expired_files = [feed['deltas'].pop(sequence) for sequence in expired]
+    feed_path = os.path.join(feed_dir, "feed.json")
+    with open(feed_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(feed, f, indent=1)
+    os.replace(feed_path + ".tmp", feed_path)
+
+    # Remove old files only once feed.json no longer refers to them, keeping the
+    # previous snapshot for clients that fetched the old feed.json
+    keep = {snapshot_file, old_snapshot} | set(feed['deltas'].values())
+    for f in os.listdir(feed_dir):
+        if f.endswith('.bin') and f not in keep and (f.startswith('snapshot-') or f in expired_files):
+            os.remove(os.path.join(feed_dir, f))
+    return len(added)
+
+def publish_feed_file(json_path, feed_dir):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return publish_feed(feed_dir, json.load(f))
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "pack":
+        count = pack_strikes_file(sys.argv[2], sys.argv[3])
+        print(f"Packed {count} strikes into {sys.argv[3]} ({os.path.getsize(sys.argv[3])} bytes)")
+    elif len(sys.argv) in (4, 5) and sys.argv[1] == "ingest":
+        added = ingest_strikes_file(sys.argv[2], sys.argv[3], *sys.argv[4:])
+        print(f"Added {added} new strikes to {sys.argv[3]}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "feed":
+        added = publish_feed_file(sys.argv[2], sys.argv[3])
+        print(f"Published {added} new strikes to {sys.argv[3]}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "density":
+        rebuilt = publish_density_source(sys.argv[2], sys.argv[3])
+        print(f"Rebuilt density grids for {rebuilt} day(s) in {sys.argv[3]}")
+    else:
+        print("Usage: python lightning_store.py pack strikes.json strikes.bin\n"
+              "       python lightning_store.py ingest strikes.json lightning_archive [hour|day]\n"
+              "       python lightning_store.py feed strikes.json lightning_feed\n"
+              "       python lightning_store.py density lightning_archive|strikes.json lightning_density")
+        sys.exit(1)
@@ -0,0 +1,162 @@
+import csv
+import os
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from outlook_store import OutlookStore, OutlookArchive, load_kml_cache_index, read_cached_kml
+
+
+# Date-Risk Index
+# One row per (day, outlook, risk name) for every day an outlook's validity walks
+# over, stepping a day at a time from its start time. Outlooks without any named
+# polygons still get a row per day (risk None) so they count as a version.
+DATE_RISK_COLUMNS = ['date', 'kml', 'layer_id', 'label', 'start', 'version', 'risk']
+
+def build_date_risk_index(outlook_catalog):
+    frames = []
+    for kml, entry in outlook_catalog.items():
+        days = pd.date_range(entry['start'], entry['end'], freq='D').strftime('%Y-%m-%d').to_numpy()
+        names = np.array(entry['risks'] or [None], dtype=object)
+        if not len(days):
+            continue
+        frames.append(pd.DataFrame({
+            'date': np.repeat(days, len(names)),
+            'kml': kml,
+            'layer_id': entry['layer_id'],
+            'label': f"{entry['start'].strftime('%d/%m/%Y')} Version {entry['version']}",
+            'start': entry['start'],
+            'version': entry['version'],
+            'risk': np.tile(names, len(days)),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=DATE_RISK_COLUMNS).astype({'start': 'datetime64[ns]', 'version': int})
+    return pd.concat(frames, ignore_index=True)
+
+# Latest version per day. Rows are sorted first so a tie on version always goes
+# to the earliest-starting outlook, then the first KML path, whatever order the
+# index was assembled in.
+def latest_outlook_per_day(date_risk_index):
+    outlook_days = (date_risk_index.drop_duplicates(['date', 'kml'])
+                    .sort_values(['date', 'start', 'version', 'kml']).reset_index(drop=True))
+    return outlook_days.loc[outlook_days.groupby('date')['version'].idxmax(), ['date', 'kml']]
+
+# Point Risk History
+# Highest risk and "Risk of" flags at each (lat, lon) point for every day in
+# [start, end] on which it fell inside the latest outlook version for that day.
+# All points are matched in one pass against an STRtree of those outlooks'
+# polygons. outlooks is any mapping shaped like all_kmls_data (all_kmls_data,
+# an OutlookArchive, CachedOutlooks); only the outlooks that are latest for some
+# day in the range and whose catalog bounds contain a point are read.
+def point_risk_history(points, start, end, outlooks, outlook_catalog):
+    risk_priority = {'High risk': 2, 'Moderate risk': 3, 'Enhanced risk': 4, 'Slight risk': 5, 'Low risk': 6}
+    columns = ['lat', 'lon', 'date', 'risk', 'risk_of']
+    index = build_date_risk_index(outlook_catalog)
+    index = index[(index['date'] >= start.strftime('%Y-%m-%d')) & (index['date'] <= end.strftime('%Y-%m-%d'))]
+    latest = latest_outlook_per_day(index)
+    if latest.empty or not len(points):
+        return pd.DataFrame(columns=columns)
+
+    lats, lons = np.asarray(points, dtype=float).reshape(-1, 2).T
+    geoms, geom_kmls, geom_names = [], [], []
+    for kml in latest['kml'].unique():
+        # Outlooks without recorded bounds are always read
+        bounds = outlook_catalog[kml].get('bounds')
+        if bounds is not None:
+            min_lon, min_lat, max_lon, max_lat = bounds
+            if not np.any((lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)):
+                continue
+        kml_gdf = outlooks[kml][2]
+        geoms.extend(kml_gdf.geometry.to_numpy())
+        geom_kmls.extend([kml] * len(kml_gdf))
+        geom_names.extend(kml_gdf['Name'].tolist() if 'Name' in kml_gdf else [None] * len(kml_gdf))
+    if not geoms:
+        return pd.DataFrame(columns=columns)
+    point_idx, geom_idx = shapely.STRtree(geoms).query(shapely.points(lons, lats), predicate='intersects')
+    hits = pd.DataFrame({
+        'point': point_idx,
+        'kml': np.asarray(geom_kmls, dtype=object)[geom_idx],
+        'risk': np.asarray(geom_names, dtype=object)[geom_idx],
+    })
+    hits = hits[hits['risk'].notna()].merge(latest, on='kml')
+    if hits.empty:
+        return pd.DataFrame(columns=columns)
+
+    is_flag = hits['risk'].str.contains('Risk of', regex=False)
+    levels = hits[~is_flag].assign(priority=hits['risk'].map(risk_priority).fillna(10))
+    highest = levels.sort_values('priority', kind='stable').drop_duplicates(['point', 'date'])[['point', 'date', 'risk']]
+    flags = (hits[is_flag].drop_duplicates(['point', 'date', 'risk'])
+             .groupby(['point', 'date'])['risk'].agg(sorted).rename('risk_of').reset_index())
+    history = highest.merge(flags, on=['point', 'date'], how='outer').sort_values(['point', 'date'])
+    history['risk'] = history['risk'].astype(object).where(history['risk'].notna(), None)
+    history['risk_of'] = [flag if isinstance(flag, list) else [] for flag in history['risk_of']]
+    history['lat'] = lats[history['point'].to_numpy()]
+    history['lon'] = lons[history['point'].to_numpy()]
+    return history[columns].reset_index(drop=True)
+
+# Risk History at a Point
+# Reads either an OutlookStore database or the kml_cache directory written by
+# run_processing, so no KML is parsed to answer a query. Points are given as
+# lat,lon arguments or as a CSV file of lat,lon rows.
+def catalog_from_cache_index(cache_index):
+    return {kml: {
+        'layer_id': kml.replace('\\', '/').split('/')[-1].replace('.kml', ''),
+        'start': datetime.fromisoformat(entry['start']),
+        'end': datetime.fromisoformat(entry['end']),
+        'version': int(entry['version']),
+        'risks': entry.get('risks', []),
+        'hash': entry.get('hash'),
+        'bounds': entry.get('bounds'),
+    } for kml, entry in cache_index.items()}
+
+# The kml_cache directory seen as all_kmls_data, reading one parquet per access
+class CachedOutlooks(Mapping):
+    def __init__(self, cache_dir, cache_index=None):
+        self.cache_dir = cache_dir
+        self.cache_index = load_kml_cache_index(cache_dir) if cache_index is None else cache_index
+
+    def __getitem__(self, kml):
+        return read_cached_kml(self.cache_index[kml], self.cache_dir)
+
+    def __iter__(self):
+        return iter(self.cache_index)
+
+    def __len__(self):
+        return len(self.cache_index)
+
+def read_points(args):
+    points = []
+    for arg in args:
+        if os.path.isfile(arg):
+            with open(arg, 'r', encoding='utf-8', newline='') as f:
+                points.extend((float(row[0]), float(row[1])) for row in csv.reader(f) if row and not row[0].startswith('#'))
+        else:
+            lat, lon = arg.split(',')
+            points.append((float(lat), float(lon)))
+    return points
+
+def query_source(source, points, start, end):
+    if os.path.isdir(source):
+        outlooks = CachedOutlooks(source)
+        return point_risk_history(points, start, end, outlooks, catalog_from_cache_index(outlooks.cache_index))
+    store = OutlookStore(source)
+    try:
+        return point_risk_history(points, start, end, OutlookArchive(store), store.catalog())
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        print("Usage: python outlook_query.py kml_cache|outlooks.sqlite YYYY-MM-DD YYYY-MM-DD lat,lon|points.csv ...")
+        sys.exit(1)
+    start = datetime.fromisoformat(sys.argv[2])
+    end = datetime.fromisoformat(sys.argv[3])
+    history = query_source(sys.argv[1], read_points(sys.argv[4:]), start, end)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['lat', 'lon', 'date', 'risk', 'risk_of'])
+    for lat, lon, date_str, risk, risk_of in history.itertuples(index=False):
+        writer.writerow([lat, lon, date_str, risk or '', '; '.join(risk_of)])
@@ -0,0 +1,218 @@
+import json
+import os
+import sqlite3
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+
+import geopandas as gpd
+import shapely
+
+
+# SQLite Outlook Store
+# Cleaned outlooks are kept one row per polygon with WKB geometry. An R-tree over
+# the polygon bounding boxes and an index on each outlook's validity window answer
+# "which outlooks covered this point / this day?" without loading the archive.
+# Discussions are edited independently of the KMLs, so they are not stored and
+# are re-applied on read, as with the KML cache.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outlooks (
+    id INTEGER PRIMARY KEY,
+    kml TEXT NOT NULL UNIQUE,
+    layer_id TEXT NOT NULL,
+    valid_from TEXT NOT NULL,
+    valid_to TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    risks TEXT NOT NULL,
+    mtime REAL,
+    size INTEGER,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS outlooks_validity ON outlooks (valid_from, valid_to);
+CREATE TABLE IF NOT EXISTS polygons (
+    id INTEGER PRIMARY KEY,
+    outlook_id INTEGER NOT NULL REFERENCES outlooks (id) ON DELETE CASCADE,
+    name TEXT,
+    properties TEXT NOT NULL,
+    geometry BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS polygons_outlook ON polygons (outlook_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS polygons_rtree USING rtree (id, min_lon, max_lon, min_lat, max_lat);
+CREATE TRIGGER IF NOT EXISTS polygons_rtree_delete AFTER DELETE ON polygons BEGIN
+    DELETE FROM polygons_rtree WHERE id = old.id;
+END;
+'''
+
+def outlook_risks(kml_gdf):
+    if 'Name' not in kml_gdf:
+        return []
+    return [name for name in kml_gdf['Name'].unique().tolist() if isinstance(name, str)]
+
+# KML Cache Readers
+# The kml_cache directory written by run_processing: index.json maps each KML to
+# its parsed times, risk names, bounds and the GeoParquet holding its cleaned
+# polygons. Kept here so readers of the cache need not import the map app.
+def load_kml_cache_index(cache_dir):
+    index_path = os.path.join(cache_dir, "index.json")
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable KML cache index: {e}")
+        return {}
+
+def read_cached_kml(cache_entry, cache_dir, discussions=None):
+    cleaned_data = gpd.read_parquet(os.path.join(cache_dir, cache_entry['data_file']))
+    # Discussions are edited independently of the KML, so always re-apply them
+    kml_filename = cache_entry['filename']
+    if discussions and kml_filename in discussions:
+        cleaned_data['discussion'] = discussions[kml_filename]
+    else:
+        cleaned_data['discussion'] = "No discussion available."
+    start = datetime.fromisoformat(cache_entry['start'])
+    end = datetime.fromisoformat(cache_entry['end'])
+    return start, end, cleaned_data, cache_entry['version']
+
+class OutlookStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def cache_keys(self):
+        rows = self.conn.execute('SELECT kml, mtime, size, hash FROM outlooks')
+        return {kml: {'mtime': mtime, 'size': size, 'hash': content_hash} for kml, mtime, size, content_hash in rows}
+
+    # Version of the cleaning code the stored outlooks were produced by, kept in
+    # SQLite's user_version so a schema change is not needed to record it
+    def format_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_format_version(self, version):
+        with self.conn:
+            self.conn.execute(f'PRAGMA user_version = {int(version)}')
+
+    def put(self, kml, start, end, kml_gdf, version, cache_key=None):
+        cache_key = cache_key or {}
+        layer_id = kml.replace('\\', '/').split('/')[-1].replace('.kml', '')
+        properties = kml_gdf.drop(columns=[kml_gdf.geometry.name, 'discussion'], errors='ignore').to_dict('records')
+        geometries = kml_gdf.geometry.to_numpy()
+        with self.conn:
+            self.conn.execute('DELETE FROM outlooks WHERE kml = ?', (kml,))
+            outlook_id = self.conn.execute(
+                'INSERT INTO outlooks (kml, layer_id, valid_from, valid_to, version, risks, mtime, size, hash) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (kml, layer_id, start.isoformat(), end.isoformat(), int(version), json.dumps(outlook_risks(kml_gdf)),
+                 cache_key.get('mtime'), cache_key.get('size'), cache_key.get('hash'))).lastrowid
+            for record, geometry, bounds in zip(properties, geometries, shapely.bounds(geometries)):
+                if geometry is None or geometry.is_empty:
+                    continue
+                polygon_id = self.conn.execute(
+                    'INSERT INTO polygons (outlook_id, name, properties, geometry) VALUES (?, ?, ?, ?)',
+                    (outlook_id, record.get('Name'), json.dumps(record, default=str), shapely.to_wkb(geometry))).lastrowid
+                min_lon, min_lat, max_lon, max_lat = bounds.tolist()
+                self.conn.execute('INSERT INTO polygons_rtree VALUES (?, ?, ?, ?, ?)',
+                                  (polygon_id, min_lon, max_lon, min_lat, max_lat))
+
+    # Drops outlooks whose KML is no longer in the archive
+    def retain(self, kmls):
+        kmls = set(kmls)
+        stale = [(kml,) for (kml,) in self.conn.execute('SELECT kml FROM outlooks') if kml not in kmls]
+        with self.conn:
+            self.conn.executemany('DELETE FROM outlooks WHERE kml = ?', stale)
+        return len(stale)
+
+    # Same shape as build_outlook_catalog, without touching any geometry. Bounds
+    # come from the R-tree boxes of each outlook's polygons.
+    def catalog(self):
+        rows = self.conn.execute(
+            'SELECT o.kml, o.layer_id, o.valid_from, o.valid_to, o.version, o.risks, o.hash, '
+            'MIN(r.min_lon), MIN(r.min_lat), MAX(r.max_lon), MAX(r.max_lat) FROM outlooks o '
+            'LEFT JOIN polygons p ON p.outlook_id = o.id LEFT JOIN polygons_rtree r ON r.id = p.id '
+            'GROUP BY o.id ORDER BY o.valid_from, o.kml')
+        return {kml: {
+            'layer_id': layer_id,
+            'start': datetime.fromisoformat(valid_from),
+            'end': datetime.fromisoformat(valid_to),
+            'version': version,
+            'risks': json.loads(risks),
+            'hash': content_hash,
+            'bounds': None if bounds[0] is None else list(bounds),
+        } for kml, layer_id, valid_from, valid_to, version, risks, content_hash, *bounds in rows}
+
+    def read(self, kml, discussions=None):
+        row = self.conn.execute('SELECT id, valid_from, valid_to, version FROM outlooks WHERE kml = ?', (kml,)).fetchone()
+        if row is None:
+            raise KeyError(kml)
+        outlook_id, valid_from, valid_to, version = row
+        polygons = self.conn.execute('SELECT properties, geometry FROM polygons WHERE outlook_id = ? ORDER BY id',
+                                     (outlook_id,)).fetchall()
+        kml_gdf = gpd.GeoDataFrame([json.loads(properties) for properties, _ in polygons],
+                                   geometry=shapely.from_wkb([geometry for _, geometry in polygons]), crs="EPSG:4326")
+        kml_filename = kml.replace('\\', '/').split('/')[-1]
+        if discussions and kml_filename in discussions:
+            kml_gdf['discussion'] = discussions[kml_filename]
+        else:
+            kml_gdf['discussion'] = "No discussion available."
+        return datetime.fromisoformat(valid_from), datetime.fromisoformat(valid_to), kml_gdf, str(version)
+
+    # Outlooks whose validity window overlaps [start, end]
+    def kmls_between(self, start, end):
+        rows = self.conn.execute('SELECT kml FROM outlooks WHERE valid_to >= ? AND valid_from <= ? ORDER BY valid_from, kml',
+                                 (start.isoformat(), end.isoformat()))
+        return [kml for (kml,) in rows]
+
+    # Polygons containing the point (boundary included), optionally limited to
+    # outlooks valid at some point in [start, end]
+    def polygons_at(self, lon, lat, start=None, end=None):
+        query = ('SELECT o.kml, o.version, o.valid_from, o.valid_to, p.name, p.geometry FROM polygons_rtree r '
+                 'JOIN polygons p ON p.id = r.id JOIN outlooks o ON o.id = p.outlook_id '
+                 'WHERE r.min_lon <= ? AND r.max_lon >= ? AND r.min_lat <= ? AND r.max_lat >= ?')
+        params = [lon, lon, lat, lat]
+        if start is not None:
+            query += ' AND o.valid_to >= ?'
+            params.append(start.isoformat())
+        if end is not None:
+            query += ' AND o.valid_from <= ?'
+            params.append(end.isoformat())
+        rows = self.conn.execute(query, params).fetchall()
+        if not rows:
+            return []
+        hits = shapely.intersects_xy(shapely.from_wkb([row[5] for row in rows]), lon, lat)
+        return [{'kml': kml, 'version': version, 'start': datetime.fromisoformat(valid_from),
+                 'end': datetime.fromisoformat(valid_to), 'risk': name}
+                for (kml, version, valid_from, valid_to, name, _), hit in zip(rows, hits) if hit]
+
+# The store seen as all_kmls_data. Each access reads one outlook from SQLite, so
+# a builder that iterates it only ever holds the outlook it is working on.
+class OutlookArchive(Mapping):
+    def __init__(self, store, discussions=None):
+        self.store = store
+        self.discussions = discussions
+        self.kmls = list(store.catalog())
+
+    def __getitem__(self, kml):
+        return self.store.read(kml, self.discussions)
+
+    def __iter__(self):
+        return iter(self.kmls)
+
+    def __len__(self):
+        return len(self.kmls)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "day":
+        store = OutlookStore(sys.argv[2])
+        day = datetime.fromisoformat(sys.argv[3])
+        for kml in store.kmls_between(day, day.replace(hour=23, minute=59, second=59)):
+            print(kml)
+        store.close()
+    else:
+        print("Usage: python outlook_store.py day outlooks.sqlite YYYY-MM-DD")
+        sys.exit(1)
@@ -1,21 +1,39 @@
 import geopandas as gpd
 import folium
 import pandas as pd
+import numpy as np
+import shapely
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from urllib3.exceptions import MaxRetryError, ProtocolError
 from webdriver_manager.chrome import ChromeDriverManager
-from PIL import Image
+from PIL import Image, ImageDraw, ImageColor
 import time
 import os
+import sys
 import subprocess
 from datetime import datetime, timedelta
 import re
+import math
+import struct
+import io
 import json
+import gzip
+import sqlite3
+import hashlib
 import webbrowser
+from urllib.parse import quote
 import requests
 from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
+from lightning_store import time_indexed_strikes
+from outlook_store import OutlookStore, OutlookArchive, outlook_risks, load_kml_cache_index, read_cached_kml
+from outlook_query import build_date_risk_index, latest_outlook_per_day
 
 
 # 1. Load and Parse the KML File
@@ -32,6 +50,11 @@ def load_kml(kml_file_path, discussions=None):
     return gdf
 
 # 2. Pre-process KML Data to Resolve Overlaps
+# Each risk tier loses the area of every more severe tier (lower priority value),
+# so the nested outlook polygons become non-overlapping bands. "Risk of" and other
+# unranked polygons (priority 0) are overlays: they neither cut nor get cut.
+# Tiers are walked from most severe, the blocking area is unioned once per tier,
+# and an STRtree limits the differences to geometries that intersect it.
 def clean_kml_data(kml_data):
     risk_priority = {
         'Low risk': 6,
@@ -42,17 +65,27 @@ def clean_kml_data(kml_data):
     }
     kml_data['priority'] = kml_data['Name'].map(risk_priority).fillna(0)
     kml_data = kml_data.sort_values(by='priority', ascending=False)
-    cleaned_gdf = gpd.GeoDataFrame(columns=kml_data.columns, crs=kml_data.crs)
-    for idx, row in kml_data.iterrows():
-        current_geom = row['geometry']
-        for _, lower_row in cleaned_gdf.iterrows():
-            if lower_row['priority'] < row['priority']:
-                current_geom = current_geom.difference(lower_row['geometry'])
-        if not current_geom.is_empty:
-            new_row = gpd.GeoDataFrame([row.drop('geometry').to_dict() | {'geometry': current_geom}], crs=kml_data.crs)
-            cleaned_gdf = pd.concat([cleaned_gdf, new_row], ignore_index=True)
+    priorities = kml_data['priority'].to_numpy()
+    geoms = kml_data['geometry'].to_numpy().copy()
+    tiered = np.flatnonzero(priorities > 0)
+    # Hand-drawn rings occasionally self-intersect, which difference cannot take
+    invalid = tiered[~shapely.is_valid(geoms[tiered])]
+    geoms[invalid] = shapely.make_valid(geoms[invalid])
+    original = geoms.copy()
+    blocker = None
+    for priority in np.sort(pd.unique(priorities[tiered])):
+        positions = np.flatnonzero(priorities == priority)
+        if blocker is not None:
+            hits = shapely.STRtree(geoms[positions]).query(blocker, predicate='intersects')
+            targets = positions[hits]
+            geoms[targets] = shapely.difference(geoms[targets], blocker)
+        tier_area = shapely.union_all(original[positions])
+        blocker = tier_area if blocker is None else shapely.union(blocker, tier_area)
+    keep = ~shapely.is_empty(geoms)
+    cleaned_gdf = kml_data[keep].copy()
+    cleaned_gdf['geometry'] = geoms[keep]
     #print("Cleaned GeoDataFrame:", cleaned_gdf.head())
-    return cleaned_gdf
+    return cleaned_gdf.reset_index(drop=True)
 
 # 3. Parse Time Range from KML Filename (Fixed versioning)
 def parse_kml_time(kml_file):
@@ -75,6 +108,284 @@ def parse_kml_time(kml_file):
     #print(f"Filename {kml_file} did not match the expected pattern.")
     return None, None, None
 
+# Cache Cleaned KML Data Between Runs
+# Archived outlooks never change, so the cleaned GeoDataFrame and parsed times are
+# stored as GeoParquet keyed by path, mtime and content hash. Only new or edited
+# KMLs are parsed and cleaned again. KML_CACHE_FORMAT is part of every key: bump it
+# whenever load_kml, clean_kml_data or parse_kml_time change their output, and
+# everything cached by the old code is rebuilt.
+KML_CACHE_FORMAT = 2
+
+def hash_file(file_path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def kml_cache_key(kml_path, cached_entry=None):
+    stat = os.stat(kml_path)
+    # Only re-hash when the file has been touched since it was cached
+    if cached_entry and cached_entry.get('mtime') == stat.st_mtime and cached_entry.get('size') == stat.st_size:
+        content_hash = cached_entry['hash']
+    else:
+        content_hash = hash_file(kml_path)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': content_hash, 'format': KML_CACHE_FORMAT}
+
+def save_kml_cache_index(cache_index, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, "index.json")
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache_index, f, indent=1)
+    os.replace(tmp_path, index_path)
+    # Drop cached frames no longer referenced by any KML
+    referenced = {entry['data_file'] for entry in cache_index.values()}
+    for f in os.listdir(cache_dir):
+        if f.endswith('.parquet') and f not in referenced:
+            os.remove(os.path.join(cache_dir, f))
+
+def write_cached_kml(kml_path, cache_key, kml_result, cache_dir):
+    start, end, cleaned_data, version = kml_result
+    os.makedirs(cache_dir, exist_ok=True)
+    data_file = f"{cache_key['hash']}.f{KML_CACHE_FORMAT}.parquet"
+    cleaned_data.to_parquet(os.path.join(cache_dir, data_file))
+    return cache_key | {
+        'filename': os.path.basename(kml_path),
+        'data_file': data_file,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'version': version,
+        'risks': outlook_risks(cleaned_data),
+        'bounds': cleaned_data.total_bounds.tolist() if len(cleaned_data) else None,
+    }
+
+# Parse and Clean KMLs Across a Process Pool
+# Top-level so it can be pickled into worker processes
+def ingest_kml(kml_path, discussions=None):
+    start, end, version = parse_kml_time(os.path.basename(kml_path))
+    if not (start and end):
+        return None
+    kml_data = load_kml(kml_path, discussions)
+    return start, end, clean_kml_data(kml_data), version
+
+def ingest_kmls(kml_paths, discussions=None, max_workers=None):
+    discussions = discussions or {}
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # Only ship each worker the discussion it needs, not the whole file
+    def discussion_for(kml_path):
+        kml_filename = os.path.basename(kml_path)
+        return {kml_filename: discussions[kml_filename]} if kml_filename in discussions else {}
+
+    results = {}
+    failures = {}
+    if max_workers <= 1 or len(kml_paths) <= 1:
+        for kml_path in kml_paths:
+            try:
+                results[kml_path] = ingest_kml(kml_path, discussion_for(kml_path))
+            except Exception as e:
+                failures[kml_path] = f"{type(e).__name__}: {e}"
+        return results, failures
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(kml_paths))) as executor:
+        futures = {kml_path: executor.submit(ingest_kml, kml_path, discussion_for(kml_path)) for kml_path in kml_paths}
+        # Collect in submission order so the output never depends on scheduling
+        for kml_path, future in futures.items():
+            try:
+                results[kml_path] = future.result()
+            except Exception as e:
+                failures[kml_path] = f"{type(e).__name__}: {e}"
+    return results, failures
+
+def load_all_kmls(kml_files, base_dir, discussions, cache_dir, max_workers=None):
+    cache_index = load_kml_cache_index(cache_dir)
+    new_index = {}
+    cached_data = {}
+    cache_keys = {}
+    for kml_path in kml_files:
+        kml = os.path.relpath(kml_path, base_dir)
+        cached_entry = cache_index.get(kml)
+        cache_keys[kml_path] = kml_cache_key(kml_path, cached_entry)
+        if cached_entry and cached_entry['hash'] == cache_keys[kml_path]['hash'] and cached_entry.get('format') == KML_CACHE_FORMAT:
+            try:
+                cached_data[kml_path] = read_cached_kml(cached_entry, cache_dir, discussions)
+                new_index[kml] = cached_entry | cache_keys[kml_path]
+            except Exception as e:
+                print(f"Cache entry for {kml} unusable, re-parsing: {e}")
+
+    to_ingest = [kml_path for kml_path in kml_files if kml_path not in cached_data]
+    ingested, failures = ingest_kmls(to_ingest, discussions, max_workers)
+    for kml_path, error in failures.items():
+        print(f"Failed to load {kml_path}: {error}")
+
+    all_kmls_data = {}
+    for kml_path in kml_files:
+        kml = os.path.relpath(kml_path, base_dir)
+        if kml_path in cached_data:
+            all_kmls_data[kml] = cached_data[kml_path]
+        elif ingested.get(kml_path) is not None:
+            all_kmls_data[kml] = ingested[kml_path]
+            try:
+                new_index[kml] = write_cached_kml(kml_path, cache_keys[kml_path], all_kmls_data[kml], cache_dir)
+            except Exception as e:
+                print(f"Failed to cache {kml}: {e}")
+    try:
+        save_kml_cache_index(new_index, cache_dir)
+    except OSError as e:
+        print(f"Failed to save KML cache index: {e}")
+    return all_kmls_data, failures
+
+# Keep an OutlookStore in step with the KML archive. Only new or changed KMLs are
+# parsed, in batches, so memory stays flat however large the archive grows.
+def sync_outlook_store(store, kml_files, base_dir, discussions, max_workers=None, batch_size=50):
+    # A store filled by an older clean_kml_data is re-ingested in full
+    known = store.cache_keys() if store.format_version() == KML_CACHE_FORMAT else {}
+    cache_keys = {}
+    to_ingest = []
+    for kml_path in kml_files:
+        kml = os.path.relpath(kml_path, base_dir)
+        cache_keys[kml_path] = kml_cache_key(kml_path, known.get(kml))
+        if kml not in known or known[kml]['hash'] != cache_keys[kml_path]['hash']:
+            to_ingest.append(kml_path)
+
+    failures = {}
+    for i in range(0, len(to_ingest), batch_size):
+        ingested, batch_failures = ingest_kmls(to_ingest[i:i + batch_size], discussions, max_workers)
+        failures.update(batch_failures)
+        for kml_path, result in ingested.items():
+            if result is not None:
+                store.put(os.path.relpath(kml_path, base_dir), *result, cache_key=cache_keys[kml_path])
+    for kml_path, error in failures.items():
+        print(f"Failed to load {kml_path}: {error}")
+    store.retain(os.path.relpath(kml_path, base_dir) for kml_path in kml_files)
+    if not failures:
+        store.set_format_version(KML_CACHE_FORMAT)
+    return failures
+
+# Simplify and Quantize Outlook Geometry for Publishing
+# The hand-drawn polygons carry far more vertices than a zoom 5-9 map can show.
+# Simplification tolerance is half a screen pixel at the highest published zoom,
+# and coordinates are snapped to a fixed number of decimals (4 decimals ~ 11 m).
+# One geometry is published for every zoom rather than a variant per zoom level:
+# at max_zoom the error is already sub-pixel, so lower zooms lose nothing
+# visible, and the page keeps a single copy of each outlook to fetch and draw.
+def zoom_tolerance(zoom, latitude=54.0, pixels=0.5):
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    return pixels * degrees_per_pixel * math.cos(math.radians(latitude))
+
+def equirectangular(coords):
+    return np.column_stack([coords[:, 0] * np.cos(np.radians(coords[:, 1])), coords[:, 1]])
+
+def publish_outlook(kml_data, max_zoom=9, decimals=4):
+    tolerance = zoom_tolerance(max_zoom)
+    original = kml_data['geometry'].to_numpy()
+    published = shapely.simplify(original, tolerance, preserve_topology=True)
+    published = shapely.set_precision(published, 10 ** -decimals)
+    # set_precision leaves float noise such as 51.123400000000004 behind
+    published = shapely.transform(published, lambda coords: np.round(coords, decimals))
+    # Never let a small polygon vanish from the published map
+    collapsed = shapely.is_empty(published)
+    published[collapsed] = original[collapsed]
+    published_gdf = kml_data.copy()
+    published_gdf['geometry'] = published
+    # Measured with longitude scaled by cos(latitude), so both axes are in
+    # degrees of latitude, and one degree of latitude is taken as 111.32 km
+    deviation = shapely.hausdorff_distance(shapely.transform(original, equirectangular),
+                                           shapely.transform(published, equirectangular))
+    stats = {
+        'tolerance_deg': tolerance,
+        'original_bytes': len(kml_data.to_json()),
+        'published_bytes': len(published_gdf.to_json()),
+        'max_deviation_m': float(np.max(deviation, initial=0.0)) * 111320,
+    }
+    return published_gdf, stats
+
+# Published geometry and its stats are cached in the KML cache under the KML's
+# content hash, so unchanged outlooks skip simplification and the size stats.
+# Bump PUBLISH_CACHE_FORMAT when publish_outlook's output or stats change.
+PUBLISH_CACHE_FORMAT = 2
+
+def publish_cache_paths(cache_dir, content_hash, max_zoom, decimals):
+    stem = os.path.join(cache_dir, "published",
+                        f"{content_hash}.f{KML_CACHE_FORMAT}.p{PUBLISH_CACHE_FORMAT}.z{max_zoom}d{decimals}")
+    return stem + ".parquet", stem + ".json"
+
+def publish_outlook_cached(kml_data, content_hash=None, cache_dir=None, max_zoom=9, decimals=4):
+    if not (content_hash and cache_dir):
+        return publish_outlook(kml_data, max_zoom, decimals)
+    data_path, stats_path = publish_cache_paths(cache_dir, content_hash, max_zoom, decimals)
+    if os.path.exists(data_path) and os.path.exists(stats_path):
+        try:
+            cached = gpd.read_parquet(data_path)
+            with open(stats_path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            if len(cached) == len(kml_data):
+                # Attributes (including the discussion) always come from the current frame
+                published_gdf = kml_data.copy()
+                published_gdf['geometry'] = cached.geometry.to_numpy()
+                return published_gdf, stats
+        except Exception as e:
+            print(f"Published cache entry for {content_hash} unusable, re-publishing: {e}")
+
+    published_gdf, stats = publish_outlook(kml_data, max_zoom, decimals)
+    try:
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        gpd.GeoDataFrame(geometry=published_gdf.geometry.to_numpy(), crs=published_gdf.crs).to_parquet(data_path)
+        with open(stats_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+    except Exception as e:
+        print(f"Failed to cache published outlook: {e}")
+    return published_gdf, stats
+
+# Drops entries for KMLs that left the archive and those written under another
+# format or publish setting
+def prune_publish_cache(cache_dir, content_hashes, max_zoom, decimals):
+    published_dir = os.path.join(cache_dir, "published")
+    if not os.path.isdir(published_dir):
+        return
+    current = {os.path.basename(path) for content_hash in content_hashes if content_hash
+               for path in publish_cache_paths(cache_dir, content_hash, max_zoom, decimals)}
+    for f in os.listdir(published_dir):
+        if f not in current:
+            os.remove(os.path.join(published_dir, f))
+
+# all_kmls_data with published geometry, produced one outlook per access so a
+# builder iterating it (including over an OutlookArchive) never holds them all.
+# stats fills in as outlooks are read.
+class PublishedOutlooks(Mapping):
+    def __init__(self, all_kmls_data, max_zoom=9, decimals=4, outlook_catalog=None, cache_dir=None):
+        self.all_kmls_data = all_kmls_data
+        self.max_zoom = max_zoom
+        self.decimals = decimals
+        self.cache_dir = cache_dir
+        self.content_hashes = {kml: entry.get('hash') for kml, entry in (outlook_catalog or {}).items()}
+        self.stats = {}
+        if cache_dir and outlook_catalog is not None:
+            prune_publish_cache(cache_dir, set(self.content_hashes.values()), max_zoom, decimals)
+
+    def __getitem__(self, kml):
+        start, end, kml_data, version = self.all_kmls_data[kml]
+        published_data, self.stats[kml] = publish_outlook_cached(kml_data, self.content_hashes.get(kml), self.cache_dir,
+                                                                 self.max_zoom, self.decimals)
+        return start, end, published_data, version
+
+    def __iter__(self):
+        return iter(self.all_kmls_data)
+
+    def __len__(self):
+        return len(self.all_kmls_data)
+
+def print_publish_report(publish_stats):
+    total_original = sum(stats['original_bytes'] for stats in publish_stats.values())
+    total_published = sum(stats['published_bytes'] for stats in publish_stats.values())
+    if not total_original:
+        return
+    worst_kml = max(publish_stats, key=lambda kml: publish_stats[kml]['max_deviation_m'])
+    print(f"Published {len(publish_stats)} outlooks: {total_original} -> {total_published} bytes "
+          f"({100 * (1 - total_published / total_original):.1f}% smaller), max deviation "
+          f"{publish_stats[worst_kml]['max_deviation_m']:.0f} m ({os.path.basename(worst_kml)})")
+
 # 4. Load Discussions from Text File
 def load_discussions(discussion_file_path):
     discussions = {}
@@ -184,7 +495,474 @@ def prompt_for_discussions(new_kmls, discussion_file_path, root):
                             f"\n{discussions[kml_filename]}\n\n")
         #print(f"Appended {len(discussions)} new KML discussion entries to '{discussion_file_path}'")
 
-def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_date):
+# Pick the Outlook Shown by Default: the next future outlook, else the latest current one
+def select_default_kml(outlook_catalog, current_date):
+    current_outlooks = {}
+    future_outlooks = {}
+    for kml, entry in outlook_catalog.items():
+        start, end, version = entry['start'], entry['end'], entry['version']
+        if start <= current_date <= end:
+            current_outlooks[kml] = (start, end, version)
+        elif start > current_date:
+            future_outlooks[kml] = (start, end, version)
+
+    default_kml = None
+    if future_outlooks:
+        start_groups = defaultdict(list)
+        for kml, (start, end, version) in future_outlooks.items():
+            start_groups[start].append((kml, version))
+        earliest_start = min(start_groups.keys())
+        default_kml = max(start_groups[earliest_start], key=lambda x: int(x[1]))[0]
+    elif current_outlooks:
+        max_version = -1
+        for kml, (_, _, version) in current_outlooks.items():
+            version_num = int(version)
+            if version_num > max_version:
+                max_version = version_num
+                default_kml = kml
+    return default_kml, bool(future_outlooks)
+
+# Outlook Catalog
+# Per-outlook metadata keyed like all_kmls_data: validity window, version, risk
+# names and the KML's content hash from the cache index. The calendar, dropdown
+# labels and statistics are all built from this rather than from the geometry,
+# and a copy is published next to the outlook sidecars for other consumers.
+def build_outlook_catalog(all_kmls_data, cache_dir=None):
+    cache_index = load_kml_cache_index(cache_dir) if cache_dir else {}
+    catalog = {}
+    for kml, (start, end, kml_gdf, version) in all_kmls_data.items():
+        cached_entry = cache_index.get(kml, {})
+        catalog[kml] = {
+            'layer_id': kml.split(os.sep)[-1].replace('.kml', ''),
+            'start': start,
+            'end': end,
+            'version': int(version),
+            # Cache entries from before risks were recorded fall back to the geometry
+            'risks': cached_entry['risks'] if 'risks' in cached_entry else outlook_risks(kml_gdf),
+            'hash': cached_entry.get('hash'),
+            'bounds': cached_entry.get('bounds'),
+        }
+    return catalog
+
+def write_outlook_catalog(outlook_catalog, output_path):
+    published = {}
+    for kml, entry in outlook_catalog.items():
+        published[entry['layer_id']] = entry | {
+            'kml': kml.replace(os.sep, '/'),
+            'start': entry['start'].isoformat(),
+            'end': entry['end'].isoformat(),
+        }
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(published, f, ensure_ascii=False, indent=1)
+
+# The calendar's dateRisks: {date: [(risk, layer_id, label, version), ...]}
+def date_risks_from_index(date_risk_index):
+    named = date_risk_index[date_risk_index['risk'].notna()]
+    date_risks = {}
+    for date_str, risk, layer_id, label, version in zip(named['date'].tolist(), named['risk'].tolist(), named['layer_id'].tolist(),
+                                                        named['label'].tolist(), named['version'].tolist()):
+        date_risks.setdefault(date_str, []).append((risk, layer_id, label, version))
+    return date_risks
+
+# Write Each Outlook as a Static GeoJSON File for On-Demand Loading
+def write_outlook_sidecar(layer_id, geojson, outlook_dir):
+    os.makedirs(outlook_dir, exist_ok=True)
+    file_name = f"{layer_id}.geojson"
+    with open(os.path.join(outlook_dir, file_name), 'w', encoding='utf-8') as f:
+        json.dump(geojson, f, ensure_ascii=False, separators=(',', ':'))
+    return f"{outlook_dir.replace(os.sep, '/')}/{quote(file_name)}"
+
+# The page gets the layer -> file map inline as outlookFiles, so no separate index
+# is written. Removes files for outlooks that are no longer in the archive.
+def prune_outlook_sidecars(outlook_files, outlook_dir):
+    if not os.path.isdir(outlook_dir):
+        return
+    written = {f"{layer_id}.geojson" for layer_id in outlook_files}
+    for f in os.listdir(outlook_dir):
+        if f.endswith('.geojson') and f not in written:
+            os.remove(os.path.join(outlook_dir, f))
+
+# Export the Outlook Archive as Vector Tiles (MBTiles)
+# Every outlook goes into a single "outlooks" layer. Each feature carries its
+# layer_id, version and validity window, so the page can filter the archive
+# client-side. Tiles are Mapbox Vector Tile v2 protobufs encoded here directly,
+# so no tile server or extra dependency is needed.
+def pb_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def pb_field(field_number, wire_type, payload):
+    key = pb_varint((field_number << 3) | wire_type)
+    if wire_type == 2:
+        return key + pb_varint(len(payload)) + payload
+    return key + payload
+
+def pb_packed(field_number, values):
+    return pb_field(field_number, 2, b''.join(pb_varint(v) for v in values))
+
+def zigzag(value):
+    return (value << 1) if value >= 0 else (-value << 1) - 1
+
+def mvt_command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+def mvt_value(value):
+    if isinstance(value, bool):
+        return pb_field(7, 0, pb_varint(int(value)))
+    if isinstance(value, int):
+        return pb_field(6, 0, pb_varint(zigzag(value)))
+    if isinstance(value, float):
+        return pb_field(3, 1, struct.pack('<d', value))
+    return pb_field(1, 2, str(value).encode('utf-8'))
+
+def encode_mvt_polygon(geometry):
+    commands = []
+    cursor_x = cursor_y = 0
+    for polygon in shapely.get_parts(geometry):
+        if polygon.geom_type != 'Polygon':
+            continue
+        rings = [polygon.exterior.coords] + [ring.coords for ring in polygon.interiors]
+        for ring_index, ring_coords in enumerate(rings):
+            points = []
+            for x, y in ring_coords:
+                point = (int(round(x)), int(round(y)))
+                if not points or point != points[-1]:
+                    points.append(point)
+            if len(points) > 1 and points[0] == points[-1]:
+                points.pop()
+            area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]))
+            if len(points) < 3 or area == 0:
+                if ring_index == 0:
+                    break  # A collapsed exterior takes its holes with it
+                continue
+            # Exterior rings need a positive surveyor's area in tile coordinates, holes negative
+            if (area > 0) != (ring_index == 0):
+                points.reverse()
+            commands.append(mvt_command(1, 1))
+            for i, (x, y) in enumerate(points):
+                if i == 1:
+                    commands.append(mvt_command(2, len(points) - 1))
+                commands += [zigzag(x - cursor_x), zigzag(y - cursor_y)]
+                cursor_x, cursor_y = x, y
+            commands.append(mvt_command(7, 1))
+    return commands
+
+def encode_mvt_tile(layer_name, features, extent=4096):
+    keys, values = [], []
+    key_index, value_index = {}, {}
+    encoded_features = b''
+    for feature_id, (commands, properties) in enumerate(features, start=1):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags += [key_index[key], value_index[value_key]]
+        feature = (pb_field(1, 0, pb_varint(feature_id)) + pb_packed(2, tags) +
+                   pb_field(3, 0, pb_varint(3)) + pb_packed(4, commands))
+        encoded_features += pb_field(2, 2, feature)
+    layer = (pb_field(15, 0, pb_varint(2)) + pb_field(1, 2, layer_name.encode('utf-8')) + encoded_features +
+             b''.join(pb_field(3, 2, key.encode('utf-8')) for key in keys) +
+             b''.join(pb_field(4, 2, mvt_value(value)) for value in values) +
+             pb_field(5, 0, pb_varint(extent)))
+    return pb_field(3, 2, layer)
+
+def lonlat_to_tile_units(coords, zoom):
+    n = 2 ** zoom
+    lat = np.radians(np.clip(coords[:, 1], -85.0511, 85.0511))
+    x = (coords[:, 0] + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * n
+    return np.column_stack([x, y])
+
+def build_outlook_tiles(all_kmls_data, min_zoom=5, max_zoom=9, extent=4096, buffer=64):
+    epoch = datetime(1970, 1, 1)
+    geometries, properties = [], []
+    for kml, (start, end, kml_data, version) in all_kmls_data.items():
+        layer_id = kml.split(os.sep)[-1].replace('.kml', '')
+        for name, discussion, geometry in zip(kml_data['Name'], kml_data['discussion'], kml_data['geometry']):
+            if geometry is None or geometry.is_empty:
+                continue
+            geometries.append(geometry)
+            properties.append({
+                'layer_id': layer_id,
+                'Name': name,
+                'version': int(version),
+                'start': int((start - epoch).total_seconds()),
+                'end': int((end - epoch).total_seconds()),
+                'discussion': discussion,
+            })
+    if not geometries:
+        return
+    geometries = np.array(geometries, dtype=object)
+    pad = buffer / extent
+    for zoom in range(min_zoom, max_zoom + 1):
+        projected = shapely.transform(geometries, lambda coords: lonlat_to_tile_units(coords, zoom))
+        tree = shapely.STRtree(projected)
+        minx, miny, maxx, maxy = shapely.total_bounds(projected)
+        last_tile = 2 ** zoom - 1
+        for tile_x in range(max(int(minx), 0), min(int(maxx), last_tile) + 1):
+            for tile_y in range(max(int(miny), 0), min(int(maxy), last_tile) + 1):
+                tile_bounds = (tile_x - pad, tile_y - pad, tile_x + 1 + pad, tile_y + 1 + pad)
+                features = []
+                for i in sorted(tree.query(shapely.box(*tile_bounds), predicate='intersects')):
+                    clipped = shapely.clip_by_rect(projected[i], *tile_bounds)
+                    if clipped.is_empty:
+                        continue
+                    local = shapely.transform(clipped, lambda coords: (coords - (tile_x, tile_y)) * extent)
+                    commands = encode_mvt_polygon(local)
+                    if commands:
+                        features.append((commands, properties[i]))
+                if features:
+                    yield zoom, tile_x, tile_y, encode_mvt_tile('outlooks', features, extent)
+
+def export_outlook_mbtiles(all_kmls_data, mbtiles_path, min_zoom=5, max_zoom=9):
+    tmp_path = mbtiles_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        conn.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        tile_count = 0
+        for zoom, tile_x, tile_y, tile_data in build_outlook_tiles(all_kmls_data, min_zoom, max_zoom):
+            # MBTiles rows use the TMS scheme, counted from the south
+            conn.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                         (zoom, tile_x, 2 ** zoom - 1 - tile_y, gzip.compress(tile_data)))
+            tile_count += 1
+        vector_layers = [{
+            'id': 'outlooks',
+            'fields': {'layer_id': 'String', 'Name': 'String', 'version': 'Number',
+                       'start': 'Number', 'end': 'Number', 'discussion': 'String'},
+            'minzoom': min_zoom,
+            'maxzoom': max_zoom,
+        }]
+        metadata = {
+            'name': 'Convective Outlook Archive',
+            'format': 'pbf',
+            'type': 'overlay',
+            'minzoom': str(min_zoom),
+            'maxzoom': str(max_zoom),
+            'bounds': '-11,47,3,62',
+            'json': json.dumps({'vector_layers': vector_layers}),
+        }
+        conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, mbtiles_path)
+    return tile_count
+
+# GitHub Pages cannot serve tiles out of an SQLite file, so the archive is also
+# unpacked to a static {z}/{x}/{y}.pbf pyramid for Leaflet.VectorGrid
+def extract_mbtiles(mbtiles_path, tile_dir):
+    written = set()
+    conn = sqlite3.connect(mbtiles_path)
+    try:
+        for zoom, tile_x, tile_row, tile_data in conn.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles"):
+            tile_y = 2 ** zoom - 1 - tile_row
+            tile_path = os.path.join(tile_dir, str(zoom), str(tile_x), f"{tile_y}.pbf")
+            os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+            with open(tile_path, 'wb') as f:
+                f.write(gzip.decompress(tile_data))
+            written.add(os.path.normpath(tile_path))
+    finally:
+        conn.close()
+    for root_dir, _, files in os.walk(tile_dir):
+        for f in files:
+            tile_path = os.path.normpath(os.path.join(root_dir, f))
+            if f.endswith('.pbf') and tile_path not in written:
+                os.remove(tile_path)
+    return len(written)
+
+# Initial Lightning Snapshot
+# Fetched alongside KML ingestion with a hard timeout. The last good response is
+# kept on disk with its ETag/Last-Modified, so an unchanged feed costs a 304 and a
+# slow or failing endpoint falls back to the cached copy. The URL may also be a
+# local file path.
+LIGHTNING_URL = "https://raw.githubusercontent.com/Handry-Outlook/lightning-strikes/main/strikes.json"
+
+def read_cached_lightning(url, cache_dir="lightning_cache"):
+    meta_path = os.path.join(cache_dir, "strikes.meta.json")
+    data_path = os.path.join(cache_dir, "strikes.json")
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('url') != url:
+                return None
+        with open(data_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def fetch_lightning_snapshot(url=LIGHTNING_URL, cache_dir="lightning_cache", timeout=10):
+    if not re.match(r'https?://', url):
+        path = url[len('file://'):] if url.startswith('file://') else url
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Failed to load initial lightning data: {e}")
+            return []
+
+    meta_path = os.path.join(cache_dir, "strikes.meta.json")
+    data_path = os.path.join(cache_dir, "strikes.json")
+    cached = read_cached_lightning(url, cache_dir)
+    headers = {}
+    if cached is not None:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached is not None:
+            return cached
+        response.raise_for_status()
+        strikes = response.json()
+    except (requests.RequestException, ValueError) as e:
+        if cached is not None:
+            print(f"Failed to refresh lightning data ({e}), using cached copy")
+            return cached
+        print(f"Failed to load initial lightning data: {e}")
+        return []
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(data_path + ".tmp", 'wb') as f:
+        f.write(response.content)
+    os.replace(data_path + ".tmp", data_path)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'etag': response.headers.get('ETag'),
+                   'last_modified': response.headers.get('Last-Modified')}, f)
+    return strikes
+
+# Lightning Time Index
+# Shared by the map page and the benchmark page. Strikes are kept sorted by time
+# with numeric epoch milliseconds in `ms`, so each slider move costs two binary
+# searches plus the strikes actually in the window.
+LIGHTNING_INDEX_JS = r'''
+    // Times without an offset are UTC, as written by the scraper
+    function strikeEpochMs(time) {
+        return Date.parse(/(Z|[+-]\d\d:?\d\d)$/i.test(time) ? time : time + 'Z');
+    }
+
+    // O(n), but only run when new strikes arrive rather than on every slider move
+    function indexStrikes(strikes) {
+        var sorted = true;
+        for (var i = 0; i < strikes.length; i++) {
+            if (strikes[i].ms === undefined) { strikes[i].ms = strikeEpochMs(strikes[i].time); }
+            if (i > 0 && strikes[i].ms < strikes[i - 1].ms) { sorted = false; }
+        }
+        if (!sorted) { strikes.sort((a, b) => a.ms - b.ms); }
+        return strikes;
+    }
+
+    // First index whose time is at or after ms
+    function lowerBoundStrikes(strikes, ms) {
+        var lo = 0;
+        var hi = strikes.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >>> 1;
+            if (strikes[mid].ms < ms) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+
+    function strikesInWindow(strikes, startMs, endMs) {
+        return strikes.slice(lowerBoundStrikes(strikes, startMs), lowerBoundStrikes(strikes, endMs + 1));
+    }
+'''
+
+def write_lightning_benchmark(output_path, sizes=(1000, 10000, 100000), iterations=50, window_hours=3):
+    html = f'''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Lightning Window Benchmark</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 2em; }}
+        table {{ border-collapse: collapse; }}
+        th, td {{ border: 1px solid #ccc; padding: 0.4em 0.8em; text-align: right; }}
+    </style>
+</head>
+<body>
+    <h1>Lightning Window Benchmark</h1>
+    <p>Mean time to select a {window_hours} hour window from a day of strikes, over {iterations} random windows.</p>
+    <table id="results">
+        <tr><th>Strikes</th><th>Linear scan (ms)</th><th>Binary search (ms)</th><th>Strikes in window</th></tr>
+    </table>
+    <script>
+    {LIGHTNING_INDEX_JS}
+
+    // What updateLightning did before the time index
+    function linearWindow(strikes, startMs, endMs) {{
+        return strikes.filter(strike => {{
+            var strikeTime = new Date(strike.time).getTime();
+            return strikeTime >= startMs && strikeTime <= endMs;
+        }});
+    }}
+
+    function syntheticStrikes(count, dayStartMs) {{
+        var strikes = [];
+        for (var i = 0; i < count; i++) {{
+            var ms = dayStartMs + Math.floor(Math.random() * 86400) * 1000;
+            strikes.push({{lat: 50 + Math.random() * 9, lon: -8 + Math.random() * 10, time: new Date(ms).toISOString().slice(0, 19)}});
+        }}
+        return strikes;
+    }}
+
+    function timeWindows(select, strikes, windows) {{
+        var found = 0;
+        var start = performance.now();
+        windows.forEach(w => {{ found += select(strikes, w[0], w[1]).length; }});
+        return {{ms: (performance.now() - start) / windows.length, found: found / windows.length}};
+    }}
+
+    var dayStartMs = Date.UTC(2024, 6, 1);
+    var windowMs = {window_hours} * 3600000;
+    {json.dumps(list(sizes))}.forEach(size => {{
+        var strikes = syntheticStrikes(size, dayStartMs);
+        var indexed = indexStrikes(strikes.map(strike => Object.assign({{}}, strike)));
+        var windows = [];
+        for (var i = 0; i < {iterations}; i++) {{
+            var endMs = dayStartMs + windowMs + Math.random() * (86400000 - windowMs);
+            windows.push([endMs - windowMs, endMs]);
+        }}
+        var linear = timeWindows(linearWindow, strikes, windows);
+        var binary = timeWindows(strikesInWindow, indexed, windows);
+        if (Math.round(linear.found) !== Math.round(binary.found)) {{ console.error('Window mismatch at', size); }}
+        var row = document.getElementById('results').insertRow();
+        [size, linear.ms.toFixed(3), binary.ms.toFixed(3), Math.round(binary.found)].forEach(value => {{
+            row.insertCell().textContent = value;
+        }});
+    }});
+    </script>
+</body>
+</html>
+'''
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_date, shared_geometry=True, outlook_dir=None,
+                      archive_tiles_url=None, archive_tiles_zoom=(5, 9), lightning_archive_url=None,
+                      lightning_feed_url=None, lightning_density_url=None, lightning_density_threshold=20000,
+                      lightning_url=LIGHTNING_URL, lightning_data=None, lightning_binary_url="strikes.bin",
+                      outlook_catalog=None, date_risk_index=None):
     uk_min_lat, uk_max_lat = 47, 62
     uk_min_lon, uk_max_lon = -11, 3
     center_lat = 54.013176
@@ -205,47 +983,38 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
         'High risk': 'purple',
     }
 
-    # Initial lightning data fetch
-    lightning_url = "https://raw.githubusercontent.com/Handry-Outlook/lightning-strikes/main/strikes.json"
+    # Initial lightning data, unless the caller already fetched it alongside ingestion
+    if lightning_data is None:
+        lightning_data = fetch_lightning_snapshot(lightning_url)
     try:
-        response = requests.get(lightning_url)
-        response.raise_for_status()
-        initial_lightning_data = response.json()
-    except (requests.RequestException, ValueError) as e:
-        print(f"Failed to load initial lightning data: {e}")
+        initial_lightning_data = time_indexed_strikes(lightning_data)
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring malformed lightning data: {e}")
         initial_lightning_data = []
 
-    # Process outlooks (unchanged)
-    current_outlooks = {}
-    future_outlooks = {}
-    for kml, (start, end, _, version) in all_kmls_data.items():
-        if start <= current_date <= end:
-            current_outlooks[kml] = (start, end, version)
-        elif start > current_date:
-            future_outlooks[kml] = (start, end, version)
-
-    default_kml = None
-    if future_outlooks:
-        start_groups = defaultdict(list)
-        for kml, (start, end, version) in future_outlooks.items():
-            start_groups[start].append((kml, version))
-        earliest_start = min(start_groups.keys())
-        default_kml = max(start_groups[earliest_start], key=lambda x: int(x[1]))[0]
-    elif current_outlooks:
-        max_version = -1
-        for kml, (_, _, version) in current_outlooks.items():
-            version_num = int(version)
-            if version_num > max_version:
-                max_version = version_num
-                default_kml = kml
-
+    if outlook_catalog is None:
+        outlook_catalog = build_outlook_catalog(all_kmls_data)
+    default_kml, is_future_outlook = select_default_kml(outlook_catalog, current_date)
     default_layer_id = default_kml.split(os.sep)[-1].replace('.kml', '') if default_kml else 'none'
 
-    # Add KML layers (unchanged)
+    # Add KML layers. With shared_geometry each outlook is only emitted once, in
+    # layerDefinitions, and showLayer draws the default layer from it on load.
+    # Otherwise a folium GeoJson copy is also embedded for the LayerControl.
+    # With outlook_dir, each outlook is written to its sidecar file as it is read
+    # and only the default stays inline for the first paint; the page fetches
+    # the rest when they are selected.
     layer_groups = {}
     layer_definitions = {}
+    outlook_files = {}
     for kml, (_, _, kml_data, _) in all_kmls_data.items():
         layer_id = kml.split(os.sep)[-1].replace('.kml', '')
+        geojson = json.loads(kml_data.to_json())
+        if outlook_dir:
+            outlook_files[layer_id] = write_outlook_sidecar(layer_id, geojson, outlook_dir)
+        if not outlook_dir or layer_id == default_layer_id:
+            layer_definitions[layer_id] = geojson
+        if shared_geometry:
+            continue
         layer_group = folium.FeatureGroup(name=layer_id, show=(kml == default_kml))
         folium.GeoJson(
             kml_data,
@@ -259,7 +1028,9 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
         ).add_to(layer_group)
         layer_group.add_to(m)
         layer_groups[layer_id] = layer_group
-        layer_definitions[layer_id] = kml_data.to_json()
+
+    if outlook_dir:
+        prune_outlook_sidecars(outlook_files, outlook_dir)
 
     # Add Lightning Strike Layer (initially empty, populated via JS)
     lightning_group = folium.FeatureGroup(name="Lightning Strikes", show=True)
@@ -285,25 +1056,14 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
     # Calendar and risk data (unchanged)
     risk_priority = {'High risk': 2, 'Moderate risk': 3, 'Enhanced risk': 4, 'Slight risk': 5, 'Low risk': 6}
     risk_colors_cal = {'High risk': 'purple', 'Moderate risk': 'red', 'Enhanced risk': 'orange', 'Slight risk': 'yellow', 'Low risk': '#5aac91'}
-    date_risks = defaultdict(list)
     kml_times = {}
     kml_versions = {}
-    for kml, (kml_start, kml_end, kml_gdf, version) in all_kmls_data.items():
-        layer_id = kml.split(os.sep)[-1].replace('.kml', '')
-        kml_times[layer_id] = f"Valid: {kml_start.strftime('%d/%m/%Y %H:%M')} to {kml_end.strftime('%d/%m/%Y %H:%M')}"
-        kml_versions[layer_id] = f"{kml_start.strftime('%d/%m/%Y')} Version {version}"
-        current_date_iter = kml_start
-        while current_date_iter <= kml_end:
-            date_str = current_date_iter.strftime('%Y-%m-%d')
-            version_num = int(version)
-            base_date = kml_start.strftime('%d/%m/%Y')
-            label = f"{base_date} Version {version_num}"
-            unique_risks = set(row['Name'] for _, row in kml_gdf.iterrows())
-            risks_for_day = [(risk, layer_id, label, version_num) for risk in unique_risks]
-            date_risks[date_str].extend(risks_for_day)
-            current_date_iter += timedelta(days=1)
-
-    date_risks = dict(date_risks)
+    for entry in outlook_catalog.values():
+        kml_times[entry['layer_id']] = f"Valid: {entry['start'].strftime('%d/%m/%Y %H:%M')} to {entry['end'].strftime('%d/%m/%Y %H:%M')}"
+        kml_versions[entry['layer_id']] = f"{entry['start'].strftime('%d/%m/%Y')} Version {entry['version']}"
+    if date_risk_index is None:
+        date_risk_index = build_date_risk_index(outlook_catalog)
+    date_risks = date_risks_from_index(date_risk_index)
     months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
     current_year = current_date.year
     years = list(range(current_year - 5, current_year + 6))
@@ -356,7 +1116,7 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
     legend_html = f'''
     <!-- Valid time -->
     <div id="validTime" style="position: fixed; top: 1vh; left: 1vw; background-color: rgba(255, 255, 255, 0.8); padding: 0.5em 1em; border: 1px solid white; border-radius: 3px; z-index: 10001; font-size: 1.2em;">
-        {(f"Future Outlook - {kml_times.get(default_layer_id)}" if default_kml and future_outlooks else kml_times.get(default_layer_id, "No outlook has been issued for this day. Use risk calendar to see archive"))}
+        {(f"Future Outlook - {kml_times.get(default_layer_id)}" if default_kml and is_future_outlook else kml_times.get(default_layer_id, "No outlook has been issued for this day. Use risk calendar to see archive"))}
     </div>
     <!-- Legend Container -->
     <div id="legendContainer" style="position: fixed; bottom: 1vh; left: 0; width: 100%; background-color: white; border: 2px solid grey; z-index: 10000; font-size: 1em; padding: 0.5em; box-shadow: 0 -2px 6px rgba(0,0,0,0.3); box-sizing: border-box;">
@@ -460,9 +1220,16 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
             display: none !important;
         }}
     </style>
+    {'<script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>' if archive_tiles_url else ''}
     <script>
     var layerGroups = {json.dumps(layer_groups_json, ensure_ascii=False)};
-    var layerDefinitions = {json.dumps(layer_definitions, ensure_ascii=False)};
+    var layerDefinitions = {json.dumps(layer_definitions, ensure_ascii=False, separators=(',', ':'))};
+    var outlookFiles = {json.dumps(outlook_files, ensure_ascii=False)};
+    var outlookTilesUrl = {json.dumps(archive_tiles_url)};
+    var outlookRequests = {{}};
+    var requestedLayerId = null;
+    var renderedLayerId = null;
+    window.mapIdle = false;
     var activeLayers = {{}};
     var dateRisks = {json.dumps(date_risks, ensure_ascii=False)};
     var riskColorsCal = {json.dumps(risk_colors_cal, ensure_ascii=False)};
@@ -471,8 +1238,22 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
     var kmlTimes = {json.dumps(kml_times, ensure_ascii=False)};
     var kmlVersions = {json.dumps(kml_versions, ensure_ascii=False)};
     var currentDateStr = '{current_date_str}';
-    var lightningData = {lightning_data_json};
-    var lightningLayer = null;
+    var lightningData = indexStrikes({lightning_data_json});
+    var lightningBinaryUrl = '{lightning_binary_url}';
+    var lightningBinaryAvailable = true;
+    var lightningFeedUrl = {json.dumps(lightning_feed_url)};
+    var lightningSequence = null;
+    var lightningArchiveUrl = {json.dumps(lightning_archive_url)};
+    var lightningManifest = null;
+    var lightningChunks = {{}};
+    var lightningRequestId = 0;
+    var lightningDensityUrl = {json.dumps(lightning_density_url)};
+    var lightningDensityManifest = null;
+    var lightningDensityDays = {{}};
+    var lightningDensityThreshold = {lightning_density_threshold};
+    var lightningPointLayer = null;
+    var lightningDensityLayer = null;
+    var lightningLayer = null; // Whichever of the two is currently in use
     var lightningVisible = true;
     var selectedDate = new Date('{current_date_str}');
 
@@ -525,31 +1306,100 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
         }}
     }}
 
+    function loadOutlook(layerId) {{
+        if (layerDefinitions[layerId]) {{ return Promise.resolve(layerDefinitions[layerId]); }}
+        if (!outlookFiles[layerId]) {{ return Promise.resolve(null); }}
+        if (!outlookRequests[layerId]) {{
+            outlookRequests[layerId] = fetch(outlookFiles[layerId])
+                .then(response => response.json())
+                .then(data => {{
+                    layerDefinitions[layerId] = data;
+                    return data;
+                }})
+                .catch(error => {{
+                    delete outlookRequests[layerId];
+                    throw error;
+                }});
+        }}
+        return outlookRequests[layerId];
+    }}
+
     function showLayer(layerId) {{
-        var map = {map_id};
+        requestedLayerId = layerId;
+        document.getElementById('kmlDropdown').value = layerId;
+        // Archived outlooks come from the vector tile pyramid when one is published
+        if (outlookTilesUrl && layerId !== 'none' && !layerDefinitions[layerId]) {{
+            renderTileLayer(layerId);
+            return;
+        }}
+        loadOutlook(layerId)
+            .then(geojson => {{
+                // Ignore responses for a layer the user has already moved away from
+                if (requestedLayerId === layerId) {{ renderLayer(layerId, geojson); }}
+            }})
+            .catch(error => {{
+                console.error('Error fetching outlook ' + layerId + ':', error);
+                if (requestedLayerId === layerId) {{ renderLayer(layerId, null); }}
+            }});
+    }}
+
+    function outlookStyle(name) {{
+        var riskColors = {{
+            'Low risk': '#5aac91',
+            'Slight risk': 'yellow',
+            'Enhanced risk': 'orange',
+            'Moderate risk': 'red',
+            'High risk': 'purple'
+        }};
+        return {{
+            fill: true,
+            fillColor: riskColors[name] || 'none',
+            color: riskColors[name] || 'black',
+            weight: name in riskColors ? 1 : 2,
+            fillOpacity: name in riskColors ? 0.3 : 0
+        }};
+    }}
+
+    function clearOutlookLayers(map) {{
         map.eachLayer(function(layer) {{
             if (layer instanceof L.GeoJSON || layer instanceof L.FeatureGroup) {{
                 if (layer !== lightningLayer) {{ map.removeLayer(layer); }}
             }}
         }});
+        for (var id in activeLayers) {{ map.removeLayer(activeLayers[id]); }}
         activeLayers = {{}};
-        if (layerId !== 'none' && layerDefinitions[layerId]) {{
-            var layer = L.geoJSON(JSON.parse(layerDefinitions[layerId]), {{
-                style: function(feature) {{
-                    var riskColors = {{
-                        'Low risk': '#5aac91',
-                        'Slight risk': 'yellow',
-                        'Enhanced risk': 'orange',
-                        'Moderate risk': 'red',
-                        'High risk': 'purple'
-                    }};
-                    return {{
-                        fillColor: riskColors[feature.properties.Name] || 'none',
-                        color: riskColors[feature.properties.Name] || 'black',
-                        weight: feature.properties.Name in riskColors ? 1 : 2,
-                        fillOpacity: feature.properties.Name in riskColors ? 0.3 : 0
-                    }};
-                }},
+    }}
+
+    function renderTileLayer(layerId) {{
+        var map = {map_id};
+        clearOutlookLayers(map);
+        var layer = L.vectorGrid.protobuf(outlookTilesUrl, {{
+            rendererFactory: L.canvas.tile,
+            interactive: true,
+            minNativeZoom: {archive_tiles_zoom[0]},
+            maxNativeZoom: {archive_tiles_zoom[1]},
+            filter: function(properties) {{ return properties.layer_id === layerId; }},
+            vectorTileLayerStyles: {{
+                outlooks: function(properties) {{ return outlookStyle(properties.Name); }}
+            }}
+        }});
+        layer.on('click', function(e) {{
+            document.getElementById('discussionText').innerHTML = e.layer.properties.discussion || 'No discussion available.';
+        }});
+        layer.addTo(map);
+        activeLayers[layerId] = layer;
+        document.getElementById('discussionText').innerHTML = 'Click the outlook on the map to view its discussion.';
+        document.getElementById('validTime').innerHTML = kmlTimes[layerId] || 'Valid time not available';
+        if (lightningVisible && lightningLayer) {{ lightningLayer.addTo(map); }}
+        renderedLayerId = layerId;
+    }}
+
+    function renderLayer(layerId, geojson) {{
+        var map = {map_id};
+        clearOutlookLayers(map);
+        if (layerId !== 'none' && geojson) {{
+            var layer = L.geoJSON(geojson, {{
+                style: function(feature) {{ return outlookStyle(feature.properties.Name); }},
                 onEachFeature: function(feature, layer) {{
                     layer.bindTooltip(
                         '<b>Risk Level:</b> ' + feature.properties.Name,
@@ -562,7 +1412,7 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
             }});
             layer.addTo(map);
             activeLayers[layerId] = layer;
-            var firstFeature = JSON.parse(layerDefinitions[layerId]).features[0];
+            var firstFeature = geojson.features[0];
             document.getElementById('discussionText').innerHTML = firstFeature.properties.discussion || 'No discussion available.';
             document.getElementById('validTime').innerHTML = kmlTimes[layerId] || 'Valid time not available';
         }} else {{
@@ -570,12 +1420,40 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
             document.getElementById('validTime').innerHTML = 'No convective outlook is available for this day, please select another day';
         }}
         if (lightningVisible && lightningLayer) {{ lightningLayer.addTo(map); }}
-        document.getElementById('kmlDropdown').value = layerId;
+        renderedLayerId = layerId;
     }}
 
-    function updateLightning() {{
+    // Sets window.mapIdle and fires a 'mapidle' event once the selected outlook is
+    // drawn and no tile layer is still loading, so screenshots need not guess a delay
+    function signalWhenMapIdle() {{
+        var map = {map_id};
+        var idleChecks = 0;
+        var timer = setInterval(function() {{
+            var loading = renderedLayerId !== requestedLayerId;
+            map.eachLayer(function(layer) {{
+                if (layer instanceof L.GridLayer && layer.isLoading && layer.isLoading()) {{ loading = true; }}
+            }});
+            // Require a few consecutive idle checks so the tile fade-in has finished
+            idleChecks = loading ? 0 : idleChecks + 1;
+            if (idleChecks >= 3) {{
+                clearInterval(timer);
+                window.mapIdle = true;
+                document.dispatchEvent(new Event('mapidle'));
+            }}
+        }}, 100);
+    }}
+
+    // Called by the renderer after it resizes the viewport between captures
+    function prepareCapture() {{
         var map = {map_id};
-        if (lightningLayer) {{ map.removeLayer(lightningLayer); }}
+        window.mapIdle = false;
+        map.invalidateSize(false);
+        map.fitBounds({json.dumps(bounds)}, {{animate: false}});
+        signalWhenMapIdle();
+    }}
+
+{LIGHTNING_INDEX_JS}
+    function updateLightning() {{
         var timeSlider = document.getElementById('timeSlider');
         var rangeSlider = document.getElementById('rangeSlider');
         var unitSelector = document.getElementById('unitSelector');
@@ -593,31 +1471,441 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
         var timeDiffMs = getTimeDifferenceInMs(rangeValue, unit);
         var startTime = new Date(selectedTime.getTime() - timeDiffMs);
 
-        lightningLayer = L.featureGroup();
-        lightningData.forEach(function(strike) {{
-            var strikeTime = new Date(strike.time);
-            if (strikeTime >= startTime && strikeTime <= selectedTime) {{
-                var timeFraction = (selectedTime - strikeTime) / timeDiffMs;
-                var color = timeFraction < 0.25 ? 'red' :
-                            timeFraction < 0.5 ? 'orange' :
-                            timeFraction < 0.75 ? 'yellow' : 'blue'; // Oldest strikes are blue
-                L.circleMarker(
-                    [strike.lat, strike.lon],
-                    {{ radius: 5, color: color, fillColor: color, fillOpacity: 0.7, weight: 1 }}
-                ).add_to(lightningLayer).bindPopup(
-                    `Lightning Strike<br>Time: ${{strike.time}}`,
-                    {{ maxWidth: 200 }}
-                );
+        var requestId = ++lightningRequestId;
+        if (lightningDensityManifest && densityStrikeCount(startTime, selectedTime) > lightningDensityThreshold) {{
+            loadDensityWindow(startTime, selectedTime)
+                .then(days => {{
+                    if (requestId === lightningRequestId) {{ drawDensity(days); }}
+                }})
+                .catch(error => {{
+                    console.warn('Lightning density grids unavailable, drawing strikes:', error);
+                    lightningDensityManifest = null;
+                    updateLightning();
+                }});
+            return;
+        }}
+        if (!lightningArchiveUrl) {{
+            drawLightning(strikesInWindow(lightningData, startTime.getTime(), selectedTime.getTime()), startTime, selectedTime, timeDiffMs);
+            return;
+        }}
+        loadLightningWindow(startTime, selectedTime)
+            .then(strikes => {{
+                // Only the most recent slider position gets drawn
+                if (requestId !== lightningRequestId) {{ return; }}
+                drawLightning(strikesInWindow(strikes, startTime.getTime(), selectedTime.getTime()), startTime, selectedTime, timeDiffMs);
+            }})
+            .catch(error => {{
+                console.warn('Lightning archive unavailable, using live feed:', error);
+                lightningArchiveUrl = null;
+                drawLightning(strikesInWindow(lightningData, startTime.getTime(), selectedTime.getTime()), startTime, selectedTime, timeDiffMs);
+            }});
+    }}
+
+    function useLightningLayer(layer) {{
+        var map = {map_id};
+        if (lightningLayer && lightningLayer !== layer) {{ map.removeLayer(lightningLayer); }}
+        lightningLayer = layer;
+        if (lightningVisible) {{ lightningLayer.addTo(map); }}
+    }}
+
+    function drawLightning(strikes, startTime, selectedTime, timeDiffMs) {{
+        if (!lightningPointLayer) {{ lightningPointLayer = new LightningCanvasLayer(); }}
+        lightningPointLayer.setStrikes(strikes, startTime.getTime(), selectedTime.getTime(), timeDiffMs);
+        useLightningLayer(lightningPointLayer);
+    }}
+
+    function drawDensity(days) {{
+        if (!lightningDensityLayer) {{ lightningDensityLayer = new LightningDensityLayer(lightningDensityManifest.resolutions); }}
+        lightningDensityLayer.setDays(days);
+        useLightningLayer(lightningDensityLayer);
+    }}
+
+    // A canvas covering the map view, repositioned and redrawn after every move
+    var CanvasOverlay = L.Layer.extend({{
+        onAdd: function(map) {{
+            this._canvas = L.DomUtil.create('canvas', 'leaflet-zoom-hide');
+            // Clicks go through to the outlooks; hit-testing uses the map's click event
+            this._canvas.style.pointerEvents = 'none';
+            map.getPanes().overlayPane.appendChild(this._canvas);
+            map.on('moveend resize', this._reset, this);
+            map.on('click', this._onClick, this);
+            this._reset();
+        }},
+
+        onRemove: function(map) {{
+            L.DomUtil.remove(this._canvas);
+            map.off('moveend resize', this._reset, this);
+            map.off('click', this._onClick, this);
+        }},
+
+        _reset: function() {{
+            var size = this._map.getSize();
+            L.DomUtil.setPosition(this._canvas, this._map.containerPointToLayerPoint([0, 0]));
+            this._canvas.width = size.x;
+            this._canvas.height = size.y;
+            this._redraw();
+        }}
+    }});
+
+    // Draws every strike in the window onto one canvas, batched into a path per
+    // age colour. Moving the slider only redraws; clicks are hit-tested through a
+    // pixel grid instead of a popup bound to each marker.
+    var LightningCanvasLayer = CanvasOverlay.extend({{
+        colors: ['red', 'orange', 'yellow', 'blue'], // Newest to oldest
+        radius: 5,
+        cellSize: 16,
+
+        initialize: function() {{
+            this._strikes = [];
+            this._startMs = 0;
+            this._endMs = 0;
+            this._spanMs = 1;
+            this._grid = {{}};
+        }},
+
+        setStrikes: function(strikes, startMs, endMs, spanMs) {{
+            this._strikes = strikes;
+            this._startMs = startMs;
+            this._endMs = endMs;
+            this._spanMs = spanMs;
+            this._redraw();
+        }},
+
+        _redraw: function() {{
+            if (!this._map) {{ return; }}
+            var ctx = this._canvas.getContext('2d');
+            var width = this._canvas.width;
+            var height = this._canvas.height;
+            var radius = this.radius;
+            ctx.clearRect(0, 0, width, height);
+            this._grid = {{}};
+            var paths = this.colors.map(function() {{ return new Path2D(); }});
+            for (var i = 0; i < this._strikes.length; i++) {{
+                var strike = this._strikes[i];
+                var point = this._map.latLngToContainerPoint([strike.lat, strike.lon]);
+                if (point.x < -radius || point.y < -radius || point.x > width + radius || point.y > height + radius) {{ continue; }}
+                var bucket = Math.min(3, Math.floor((this._endMs - strike.ms) / this._spanMs * 4));
+                paths[bucket].moveTo(point.x + radius, point.y);
+                paths[bucket].arc(point.x, point.y, radius, 0, 2 * Math.PI);
+                var key = Math.floor(point.x / this.cellSize) + ':' + Math.floor(point.y / this.cellSize);
+                (this._grid[key] = this._grid[key] || []).push({{strike: strike, x: point.x, y: point.y}});
+            }}
+            // Oldest first so the newest strikes end up on top
+            for (var b = paths.length - 1; b >= 0; b--) {{
+                ctx.fillStyle = ctx.strokeStyle = this.colors[b];
+                ctx.globalAlpha = 0.7;
+                ctx.fill(paths[b]);
+                ctx.globalAlpha = 1;
+                ctx.lineWidth = 1;
+                ctx.stroke(paths[b]);
+            }}
+        }},
+
+        _onClick: function(e) {{
+            var cellX = Math.floor(e.containerPoint.x / this.cellSize);
+            var cellY = Math.floor(e.containerPoint.y / this.cellSize);
+            var best = null;
+            var bestDist = (this.radius + 2) * (this.radius + 2);
+            for (var dx = -1; dx <= 1; dx++) {{
+                for (var dy = -1; dy <= 1; dy++) {{
+                    (this._grid[(cellX + dx) + ':' + (cellY + dy)] || []).forEach(function(entry) {{
+                        var dist = Math.pow(entry.x - e.containerPoint.x, 2) + Math.pow(entry.y - e.containerPoint.y, 2);
+                        if (dist <= bestDist) {{ best = entry; bestDist = dist; }}
+                    }});
+                }}
+            }}
+            if (best) {{
+                L.popup({{ maxWidth: 200 }})
+                    .setLatLng([best.strike.lat, best.strike.lon])
+                    .setContent(`Lightning Strike<br>Time: ${{best.strike.time}}`)
+                    .openOn(this._map);
             }}
+        }}
+    }});
+
+    // Strike counts per grid cell summed over the days in the window, drawn at the
+    // finest resolution whose cells are still a few pixels across
+    var LightningDensityLayer = CanvasOverlay.extend({{
+        minCellPixels: 6,
+
+        initialize: function(resolutions) {{
+            this._resolutions = resolutions.slice().sort((a, b) => a - b);
+            this._days = [];
+            this._totals = {{}};
+        }},
+
+        setDays: function(days) {{
+            this._days = days;
+            this._totals = {{}};
+            this._redraw();
+        }},
+
+        _resolution: function() {{
+            var pixelsPerDegree = 256 * Math.pow(2, this._map.getZoom()) / 360;
+            var visible = this._resolutions.filter(res => res * pixelsPerDegree >= this.minCellPixels);
+            return visible.length ? visible[0] : this._resolutions[this._resolutions.length - 1];
+        }},
+
+        _cellTotals: function(res) {{
+            if (!this._totals[res]) {{
+                var totals = new Map();
+                this._days.forEach(day => {{
+                    var grid = day.grids[String(res)];
+                    for (var i = 0; i < grid.cells.length; i++) {{
+                        totals.set(grid.cells[i], (totals.get(grid.cells[i]) || 0) + grid.counts[i]);
+                    }}
+                }});
+                this._totals[res] = totals;
+            }}
+            return this._totals[res];
+        }},
+
+        _redraw: function() {{
+            if (!this._map) {{ return; }}
+            var ctx = this._canvas.getContext('2d');
+            ctx.clearRect(0, 0, this._canvas.width, this._canvas.height);
+            var res = this._resolution();
+            var columns = Math.round(360 / res);
+            var totals = this._cellTotals(res);
+            var max = 1;
+            totals.forEach(count => {{ max = Math.max(max, count); }});
+            var bounds = this._map.getBounds();
+            totals.forEach((count, cell) => {{
+                var south = Math.floor(cell / columns) * res - 90;
+                var west = (cell % columns) * res - 180;
+                if (south > bounds.getNorth() || south + res < bounds.getSouth() || west > bounds.getEast() || west + res < bounds.getWest()) {{ return; }}
+                var nw = this._map.latLngToContainerPoint([south + res, west]);
+                var se = this._map.latLngToContainerPoint([south, west + res]);
+                // Log scale from yellow (few strikes) to red (most in view)
+                var t = Math.log(count + 1) / Math.log(max + 1);
+                ctx.fillStyle = `hsla(${{60 - 60 * t}}, 100%, 50%, ${{0.35 + 0.45 * t}})`;
+                ctx.fillRect(nw.x, nw.y, Math.max(1, se.x - nw.x), Math.max(1, se.y - nw.y));
+            }});
+        }},
+
+        _onClick: function(e) {{
+            var res = this._resolution();
+            var row = Math.floor((e.latlng.lat + 90) / res);
+            var col = Math.floor((e.latlng.lng + 180) / res);
+            var count = this._cellTotals(res).get(row * Math.round(360 / res) + col);
+            if (count) {{
+                L.popup({{ maxWidth: 200 }})
+                    .setLatLng(e.latlng)
+                    .setContent(`${{count}} lightning strikes<br>in this ${{res}}° cell`)
+                    .openOn(this._map);
+            }}
+        }}
+    }});
+
+    function loadDensityManifest() {{
+        return fetch(lightningDensityUrl + '/manifest.json', {{cache: 'no-cache'}})
+            .then(response => {{
+                if (!response.ok) {{ throw new Error('HTTP ' + response.status); }}
+                return response.json();
+            }})
+            .then(manifest => {{
+                lightningDensityManifest = manifest;
+                return manifest;
+            }});
+    }}
+
+    // Density is binned per UTC day, so windows are widened to whole days
+    function densityDays(startTime, endTime) {{
+        var startSec = startTime.getTime() / 1000;
+        var endSec = endTime.getTime() / 1000;
+        return Object.values(lightningDensityManifest.days).filter(day => day.end >= startSec && day.start <= endSec);
+    }}
+
+    function densityStrikeCount(startTime, endTime) {{
+        return densityDays(startTime, endTime).reduce((total, day) => total + day.count, 0);
+    }}
+
+    function loadDensityWindow(startTime, endTime) {{
+        return Promise.all(densityDays(startTime, endTime).map(day => {{
+            var cached = lightningDensityDays[day.file];
+            if (cached && cached.count === day.count) {{ return cached; }}
+            return fetch(lightningDensityUrl + '/' + day.file, {{cache: 'no-cache'}})
+                .then(response => {{
+                    if (!response.ok) {{ throw new Error('HTTP ' + response.status); }}
+                    return response.json();
+                }})
+                .then(data => {{
+                    lightningDensityDays[day.file] = data;
+                    return data;
+                }});
+        }}));
+    }}
+
+    function refreshDensityManifest() {{
+        if (!lightningDensityUrl) {{ return; }}
+        var previous = JSON.stringify(lightningDensityManifest);
+        loadDensityManifest()
+            .then(manifest => {{
+                if (JSON.stringify(manifest) !== previous) {{ updateLightning(); }}
+            }})
+            .catch(error => {{
+                console.warn('Lightning density grids unavailable:', error);
+                lightningDensityUrl = null;
+            }});
+    }}
+
+    function loadLightningManifest() {{
+        return fetch(lightningArchiveUrl + '/manifest.json', {{cache: 'no-cache'}})
+            .then(response => {{
+                if (!response.ok) {{ throw new Error('HTTP ' + response.status); }}
+                return response.json();
+            }})
+            .then(manifest => {{
+                lightningManifest = manifest;
+                return manifest;
+            }});
+    }}
+
+    // Fetches only the archive chunks overlapping the window; chunks already held
+    // are reused until the manifest reports more strikes in them
+    function loadLightningWindow(startTime, endTime) {{
+        var startSec = startTime.getTime() / 1000;
+        var endSec = endTime.getTime() / 1000;
+        var manifestReady = lightningManifest ? Promise.resolve(lightningManifest) : loadLightningManifest();
+        return manifestReady.then(manifest => {{
+            var wanted = Object.values(manifest.chunks).filter(chunk => chunk.end >= startSec && chunk.start <= endSec);
+            return Promise.all(wanted.map(chunk => {{
+                var cached = lightningChunks[chunk.file];
+                if (cached && cached.count === chunk.count) {{ return cached.strikes; }}
+                return fetch(lightningArchiveUrl + '/' + chunk.file, {{cache: 'no-cache'}})
+                    .then(response => response.arrayBuffer())
+                    .then(decodeStrikes)
+                    .then(strikes => {{
+                        lightningChunks[chunk.file] = {{count: chunk.count, strikes: strikes}};
+                        return strikes;
+                    }});
+            }}));
+        }}).then(parts => mergeStrikes([].concat(...parts), lightningData));
+    }}
+
+    // Live strikes overlap the newest archive chunk, so drop exact duplicates
+    function mergeStrikes(archived, live) {{
+        var seen = new Set(archived.map(strike => strike.ms + '|' + strike.lat + '|' + strike.lon));
+        return indexStrikes(archived.concat(live.filter(strike => !seen.has(strike.ms + '|' + strike.lat + '|' + strike.lon))));
+    }}
+
+    // Reads the little-endian columnar format written by lightning_store.py
+    function decodeStrikes(buffer) {{
+        var header = new DataView(buffer, 0, 16);
+        var magic = String.fromCharCode(header.getUint8(0), header.getUint8(1), header.getUint8(2), header.getUint8(3));
+        if (magic !== 'STRK' || header.getUint32(4, true) !== 1) {{ throw new Error('Unknown strike format'); }}
+        var count = header.getUint32(8, true);
+        var times = new Uint32Array(buffer, 16, count);
+        var lats = new Int32Array(buffer, 16 + 4 * count, count);
+        var lons = new Int32Array(buffer, 16 + 8 * count, count);
+        var strikes = new Array(count);
+        for (var i = 0; i < count; i++) {{
+            strikes[i] = {{lat: lats[i] / 1e5, lon: lons[i] / 1e5, time: new Date(times[i] * 1000).toISOString(), ms: times[i] * 1000}};
+        }}
+        return strikes;
+    }}
+
+    function fetchLightningJson() {{
+        return fetch('{lightning_url}').then(response => response.json());
+    }}
+
+    function fetchStrikeFile(url) {{
+        return fetch(url, {{cache: 'no-cache'}})
+            .then(response => {{
+                if (!response.ok) {{ throw new Error('HTTP ' + response.status); }}
+                return response.arrayBuffer();
+            }})
+            .then(decodeStrikes);
+    }}
+
+    function loadLightningSnapshot(feed) {{
+        return fetchStrikeFile(lightningFeedUrl + '/' + feed.snapshot).then(strikes => {{
+            lightningData = indexStrikes(strikes);
+            lightningSequence = feed.snapshot_sequence;
+            return true;
         }});
-        if (lightningVisible) {{ lightningLayer.addTo(map); }}
+    }}
+
+    // Deltas only ever add strikes, so drop those older than the producer's
+    // current snapshot; resolves to whether anything was removed
+    function trimLiveStrikes(feed) {{
+        if (feed.live_start === undefined) {{ return false; }}
+        var first = feed.live_start === null ? lightningData.length : lowerBoundStrikes(lightningData, feed.live_start * 1000);
+        if (first === 0) {{ return false; }}
+        lightningData = lightningData.slice(first);
+        return true;
+    }}
+
+    // Appends only the deltas published since the last poll. Resolves to whether
+    // lightningData changed; falls back to the snapshot on any gap in the sequence.
+    function pollLightningFeed() {{
+        return fetch(lightningFeedUrl + '/feed.json', {{cache: 'no-cache'}})
+            .then(response => {{
+                if (!response.ok) {{ throw new Error('HTTP ' + response.status); }}
+                return response.json();
+            }})
+            .then(feed => {{
+                if (lightningSequence === feed.sequence) {{ return trimLiveStrikes(feed); }}
+                var sequences = [];
+                var gap = lightningSequence === null || feed.sequence < lightningSequence;
+                for (var seq = lightningSequence + 1; !gap && seq <= feed.sequence; seq++) {{
+                    if (!feed.deltas[seq]) {{ gap = true; }}
+                    sequences.push(seq);
+                }}
+                if (gap) {{ return loadLightningSnapshot(feed); }}
+                return Promise.all(sequences.map(seq => fetchStrikeFile(lightningFeedUrl + '/' + feed.deltas[seq])))
+                    .then(parts => {{
+                        lightningData = indexStrikes(lightningData.concat(...parts));
+                        lightningSequence = feed.sequence;
+                        trimLiveStrikes(feed);
+                        return true;
+                    }})
+                    .catch(() => loadLightningSnapshot(feed));
+            }});
     }}
 
     function fetchLightningData() {{
-        fetch('{lightning_url}')
-            .then(response => response.json())
+        refreshDensityManifest();
+        // The delta feed keeps the live strikes current, including in archive mode,
+        // so archive chunks never need refetching just because new strikes arrived
+        if (lightningFeedUrl) {{
+            pollLightningFeed()
+                .then(changed => {{
+                    if (changed) {{
+                        updateLightning();
+                        console.log('Lightning data updated:', new Date());
+                    }}
+                }})
+                .catch(error => {{
+                    // No incremental feed published; poll the full feed from now on
+                    console.warn('Lightning delta feed unavailable, using full feed:', error);
+                    lightningFeedUrl = null;
+                    fetchLightningData();
+                }});
+            return;
+        }}
+        if (lightningArchiveUrl) {{
+            loadLightningManifest()
+                .then(() => updateLightning())
+                .catch(error => console.error('Error fetching lightning manifest:', error));
+            return;
+        }}
+        var request = !lightningBinaryAvailable ? fetchLightningJson() :
+            fetch(lightningBinaryUrl)
+                .then(response => {{
+                    if (!response.ok) {{ throw new Error('HTTP ' + response.status); }}
+                    return response.arrayBuffer();
+                }})
+                .then(decodeStrikes)
+                .catch(error => {{
+                    // Fall back to the JSON feed and stop asking for the binary one
+                    console.warn('Binary lightning feed unavailable, using JSON:', error);
+                    lightningBinaryAvailable = false;
+                    return fetchLightningJson();
+                }});
+        request
             .then(data => {{
-                lightningData = data;
+                lightningData = indexStrikes(data);
                 updateLightning();
                 console.log('Lightning data updated:', new Date());
             }})
@@ -759,45 +2047,164 @@ def create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_dat
         updateCalendar();
         updateRangeLimits();
         updateLightning();
+        refreshDensityManifest();
         setInterval(fetchLightningData, 30000); // Fetch every 30 seconds
+        signalWhenMapIdle();
     }});
     </script>
     '''
     m.get_root().html.add_child(folium.Element(legend_html))
     folium.LayerControl().add_to(m)
     return m
-def analyze_outlook_data(all_kmls_data):
-    monthly_data = defaultdict(lambda: defaultdict(int))
-    yearly_data = defaultdict(lambda: defaultdict(int))
+# Outlook Statistics
+# Counts are taken from a tidy (date, risk) table holding the risks of the latest
+# outlook version for each day. New outlooks only recompute the days they cover;
+# if an outlook already seen changes or disappears, everything is rebuilt. With a
+# cache_dir the tables are kept between runs under statistics/, as parquet plus
+# a JSON file of the outlook keys they were built from.
+class OutlookStatistics:
     risk_levels = ['Low risk', 'Slight risk', 'Enhanced risk', 'Moderate risk', 'High risk']
-    daily_latest_version = {}  # Track latest version per day
+    seasons = {12: 'Winter', 1: 'Winter', 2: 'Winter', 3: 'Spring', 4: 'Spring', 5: 'Spring',
+               6: 'Summer', 7: 'Summer', 8: 'Summer', 9: 'Autumn', 10: 'Autumn', 11: 'Autumn'}
+    # Bump when the saved tables change shape
+    cache_format = 1
 
-    # First pass: Identify the latest version per day
-    for kml, (start, end, kml_data, version) in all_kmls_data.items():
-        current_date = start
-        while current_date <= end:
-            date_str = current_date.strftime('%Y-%m-%d')
-            version_num = int(version)
-            if date_str not in daily_latest_version or version_num > daily_latest_version[date_str][1]:
-                daily_latest_version[date_str] = (kml, version_num, kml_data)
-            current_date += timedelta(days=1)
-
-    # Second pass: Count unique risks only from the latest version per day
-    for date_str, (_, _, kml_data) in daily_latest_version.items():
-        year = int(date_str[:4])
-        month = int(date_str[5:7])
-        month_key = f"{year}-{month:02d}"
-        # Use a set to ensure each risk level is counted only once per day (e.g., 3 "Slight risk" polygons = 1 count)
-        unique_risks = set(row['Name'] for _, row in kml_data.iterrows() if row['Name'] in risk_levels)
-        for risk in unique_risks:
-            monthly_data[month_key][risk] += 1
-            yearly_data[year][risk] += 1
-
-    # Convert to JSON-friendly format
-    monthly_json = {month: dict(risks) for month, risks in monthly_data.items()}
-    yearly_json = {year: dict(risks) for year, risks in yearly_data.items()}
-    
-    return monthly_json, yearly_json
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.reset()
+        if cache_dir:
+            self.load()
+
+    def reset(self):
+        self.outlooks = {}
+        self.index = build_date_risk_index({})
+        self.latest = pd.DataFrame(columns=['date', 'risk'])
+
+    @staticmethod
+    def outlook_key(entry):
+        return (entry['start'].isoformat(), entry['end'].isoformat(), entry['version'], tuple(entry['risks']))
+
+    def cache_paths(self):
+        stats_dir = os.path.join(self.cache_dir, "statistics")
+        return (os.path.join(stats_dir, "outlooks.json"), os.path.join(stats_dir, "index.parquet"),
+                os.path.join(stats_dir, "latest.parquet"))
+
+    def load(self):
+        keys_path, index_path, latest_path = self.cache_paths()
+        if not os.path.exists(keys_path):
+            return
+        try:
+            with open(keys_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            index = pd.read_parquet(index_path)
+            latest = pd.read_parquet(latest_path)
+        except Exception as e:
+            print(f"Ignoring unreadable statistics cache: {e}")
+            return
+        # Row counts catch tables rewritten without their key file
+        if saved.get('format') != self.cache_format or saved.get('rows') != [len(index), len(latest)]:
+            return
+        self.outlooks = {kml: (start, end, version, tuple(risks)) for kml, (start, end, version, risks) in saved['outlooks'].items()}
+        self.index = index
+        self.latest = latest
+
+    def save(self):
+        keys_path, index_path, latest_path = self.cache_paths()
+        try:
+            os.makedirs(os.path.dirname(keys_path), exist_ok=True)
+            self.index.to_parquet(index_path, index=False)
+            self.latest.to_parquet(latest_path, index=False)
+            tmp_path = keys_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': self.cache_format, 'rows': [len(self.index), len(self.latest)],
+                           'outlooks': self.outlooks}, f, ensure_ascii=False)
+            os.replace(tmp_path, keys_path)
+        except Exception as e:
+            print(f"Failed to save statistics cache: {e}")
+
+    def latest_day_risks(self, index):
+        latest = latest_outlook_per_day(index)
+        # Each risk level counts once per day (e.g., 3 "Slight risk" polygons = 1 count)
+        risks = index.merge(latest, on=['date', 'kml'])
+        return risks.loc[risks['risk'].isin(self.risk_levels), ['date', 'risk']].drop_duplicates()
+
+    def update(self, outlook_catalog, date_risk_index=None):
+        keys = {kml: self.outlook_key(entry) for kml, entry in outlook_catalog.items()}
+        if any(keys.get(kml) != key for kml, key in self.outlooks.items()):
+            self.reset()
+            if self.cache_dir and not keys:
+                self.save()
+        new_kmls = [kml for kml in keys if kml not in self.outlooks]
+        if not new_kmls:
+            return 0
+        if date_risk_index is not None:
+            new_index = date_risk_index[date_risk_index['kml'].isin(new_kmls)]
+        else:
+            new_index = build_date_risk_index({kml: outlook_catalog[kml] for kml in new_kmls})
+        self.index = pd.concat([self.index, new_index], ignore_index=True) if len(self.index) else new_index.reset_index(drop=True)
+        self.outlooks.update((kml, keys[kml]) for kml in new_kmls)
+
+        affected = new_index['date'].unique()
+        kept = self.latest[~self.latest['date'].isin(affected)]
+        recomputed = self.latest_day_risks(self.index[self.index['date'].isin(affected)])
+        self.latest = pd.concat([kept, recomputed], ignore_index=True) if len(kept) else recomputed.reset_index(drop=True)
+        if self.cache_dir:
+            self.save()
+        return len(new_kmls)
+
+    def counts_by(self, keys):
+        result = defaultdict(dict)
+        for (key, risk), count in self.latest.groupby([keys, self.latest['risk']]).size().items():
+            result[key][risk] = int(count)
+        return dict(result)
+
+    def monthly(self):
+        return self.counts_by(self.latest['date'].str[:7])
+
+    def yearly(self):
+        return {int(year): risks for year, risks in self.counts_by(self.latest['date'].str[:4]).items()}
+
+    def weekday(self):
+        return self.counts_by(pd.to_datetime(self.latest['date']).dt.day_name())
+
+    def season(self):
+        return self.counts_by(pd.to_datetime(self.latest['date']).dt.month.map(self.seasons))
+
+    def durations(self):
+        # How often each risk level ran for n consecutive days: {risk: {n: runs}}
+        result = {}
+        for risk, group in self.latest.groupby('risk'):
+            days = pd.to_datetime(group['date']).sort_values()
+            run_ids = (days.diff() != pd.Timedelta(days=1)).cumsum()
+            run_lengths = run_ids.value_counts().value_counts().sort_index()
+            result[risk] = {int(length): int(runs) for length, runs in run_lengths.items()}
+        return result
+
+    def summary(self):
+        return {
+            'monthly': self.monthly(),
+            'yearly': self.yearly(),
+            'weekday': self.weekday(),
+            'season': self.season(),
+            'duration': self.durations(),
+        }
+
+outlook_statistics = None
+
+def get_outlook_statistics(cache_dir=None):
+    global outlook_statistics
+    if outlook_statistics is None or (cache_dir and outlook_statistics.cache_dir != cache_dir):
+        outlook_statistics = OutlookStatistics(cache_dir)
+    return outlook_statistics
+
+def analyze_outlook_data(outlook_catalog, date_risk_index=None, cache_dir=None):
+    statistics = get_outlook_statistics(cache_dir)
+    statistics.update(outlook_catalog, date_risk_index)
+    return statistics.monthly(), statistics.yearly()
+
+def write_outlook_statistics(statistics, output_path):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(statistics.summary(), f, indent=1, ensure_ascii=False)
 
 def create_monthly_chart_html(monthly_data, output_path):
     # Icon image URL (assuming it's in the repository root)
@@ -1002,31 +2409,260 @@ def create_yearly_chart_html(yearly_data, output_path):
     #print(f"Yearly chart HTML saved as {output_path}")
     
 # 7. Export Map as Image using Selenium
-def export_map_image(map_object, output_path, width=1360, height=1760):
+# One headless Chrome is kept warm and reused for every render job. It restarts
+# after a crash, and after max_renders jobs to bound its memory use.
+class MapRenderer:
+    # A dead chromedriver process surfaces as urllib3/socket errors rather than
+    # WebDriverException, so both count as a crash
+    driver_errors = (WebDriverException, MaxRetryError, ProtocolError, ConnectionError)
+
+    def __init__(self, max_renders=50):
+        self.max_renders = max_renders
+        self.driver = None
+        self.driver_path = None
+        self.render_count = 0
+
+    def start(self):
+        if self.driver_path is None:
+            self.driver_path = ChromeDriverManager().install()
+        chrome_options = Options()
+        chrome_options.add_argument('--headless')
+        chrome_options.add_argument('--disable-gpu')
+        self.driver = webdriver.Chrome(options=chrome_options, service=webdriver.chrome.service.Service(self.driver_path))
+        self.render_count = 0
+
+    def close(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except self.driver_errors:
+                pass
+            self.driver = None
+
+    def restart(self):
+        self.close()
+        self.start()
+
+    def render(self, html_path, output_path, width=1360, height=1760, timeout=20):
+        return self.render_batch(html_path, {output_path: (output_path, width, height)}, timeout)[output_path]
+
+    # Loads the page once and captures each named (output_path, width, height)
+    # by resizing the viewport. Returns the idle wait in seconds per output.
+    def render_batch(self, html_path, outputs, timeout=20):
+        if self.driver is None or self.render_count >= self.max_renders:
+            self.restart()
+        try:
+            return self._render_batch(html_path, outputs, timeout)
+        except self.driver_errors as e:
+            print(f"Renderer crashed ({e.__class__.__name__}), restarting browser")
+            self.restart()
+            return self._render_batch(html_path, outputs, timeout)
+
+    def _render_batch(self, html_path, outputs, timeout):
+        self.render_count += 1
+        wait_times = {}
+        for i, (name, (output_path, width, height)) in enumerate(outputs.items()):
+            # Set the viewport exactly, independent of window decorations
+            self.driver.execute_cdp_cmd('Emulation.setDeviceMetricsOverride',
+                                        {'width': width, 'height': height, 'deviceScaleFactor': 1, 'mobile': False})
+            if i == 0:
+                self.driver.get(f"file://{os.path.abspath(html_path)}")
+            else:
+                self.driver.execute_script("prepareCapture();")
+            wait_times[name] = self._wait_for_idle(timeout)
+            print(f"Map render wait for {name} ({width}x{height}): {wait_times[name]:.2f}s")
+            self.driver.save_screenshot(output_path)
+        return wait_times
+
+    # Waits for the page's mapidle signal instead of a fixed sleep; on timeout the
+    # screenshot is still taken
+    def _wait_for_idle(self, timeout):
+        wait_start = time.perf_counter()
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script("return window.mapIdle === true;"))
+        except TimeoutException:
+            print(f"Map did not report idle within {timeout}s, capturing anyway")
+        return time.perf_counter() - wait_start
+
+map_renderer = None
+
+def get_map_renderer():
+    global map_renderer
+    if map_renderer is None:
+        map_renderer = MapRenderer()
+    return map_renderer
+
+def export_map_image(map_object, output_path, width=1360, height=1760, timeout=20):
     map_object.save("temp_map.html")
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument(f'--window-size={width},{height}')
-    driver = webdriver.Chrome(options=chrome_options, service=webdriver.chrome.service.Service(ChromeDriverManager().install()))
-    driver.get(f"file://{os.path.abspath('temp_map.html')}")
-    time.sleep(10)
-    driver.save_screenshot(output_path)
-    driver.quit()
+    return get_map_renderer().render("temp_map.html", output_path, width, height, timeout)
+
+def export_map_images(map_object, outputs, timeout=20):
+    map_object.save("temp_map.html")
+    return get_map_renderer().render_batch("temp_map.html", outputs, timeout)
+
+# Render the Static Map Without a Browser
+# Draws the outlook polygons straight onto a cached basemap raster. The view
+# matches the Leaflet map's FitBounds, so overlay_on_template works unchanged.
+def lonlat_to_mercator(lon, lat):
+    x = np.radians(lon) * 6378137.0
+    y = np.arcsinh(np.tan(np.radians(np.clip(lat, -85.0511, 85.0511)))) * 6378137.0
+    return x, y
+
+def static_map_extent(width, height, bounds=((47, -11), (62, 3))):
+    (min_lat, min_lon), (max_lat, max_lon) = bounds
+    x0, y0 = lonlat_to_mercator(min_lon, min_lat)
+    x1, y1 = lonlat_to_mercator(max_lon, max_lat)
+    world = 2 * math.pi * 6378137.0
+    # Leaflet snaps FitBounds to whole zoom levels
+    zoom = math.floor(math.log2(min(width / ((x1 - x0) / world * 256), height / ((y1 - y0) / world * 256))))
+    metres_per_pixel = world / (256 * 2 ** zoom)
+    center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+    return (center_x - width / 2 * metres_per_pixel, center_x + width / 2 * metres_per_pixel,
+            center_y - height / 2 * metres_per_pixel, center_y + height / 2 * metres_per_pixel)
+
+def load_basemap(width, height, cache_dir="basemap_cache"):
+    extent = tuple(float(v) for v in static_map_extent(width, height))
+    cache_path = os.path.join(cache_dir, f"basemap_{width}x{height}.png")
+    if not os.path.exists(cache_path):
+        # Only needed the first time a basemap of this size is drawn
+        import cartopy.crs as ccrs
+        import cartopy.feature as cfeature
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        os.makedirs(cache_dir, exist_ok=True)
+        fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.Mercator.GOOGLE)
+        ax.set_extent(extent, crs=ccrs.Mercator.GOOGLE)
+        ax.add_feature(cfeature.OCEAN.with_scale('10m'), facecolor='#cde4f2', edgecolor='none')
+        ax.add_feature(cfeature.LAND.with_scale('10m'), facecolor='#f2efe9', edgecolor='none')
+        ax.add_feature(cfeature.COASTLINE.with_scale('10m'), linewidth=0.6, edgecolor='#7a8a99')
+        ax.add_feature(cfeature.BORDERS.with_scale('10m'), linewidth=0.4, edgecolor='#999999')
+        ax.spines['geo'].set_visible(False)
+        fig.savefig(cache_path, dpi=100)
+    return Image.open(cache_path).convert('RGBA'), extent
+
+def render_static_map(kml_data, output_path, width=1360, height=1760, cache_dir="basemap_cache"):
+    risk_colors = {
+        'Low risk': '#5aac91',
+        'Slight risk': 'yellow',
+        'Enhanced risk': 'orange',
+        'Moderate risk': 'red',
+        'High risk': 'purple',
+    }
+    image, (x0, x1, y0, y1) = load_basemap(width, height, cache_dir)
+
+    def to_pixels(coords):
+        coords = np.asarray(coords)
+        x, y = lonlat_to_mercator(coords[:, 0], coords[:, 1])
+        return list(zip((x - x0) / (x1 - x0) * width, (y1 - y) / (y1 - y0) * height))
+
+    if kml_data is not None:
+        # Same styling and draw order as the interactive map
+        for name, geometry in zip(kml_data['Name'], kml_data['geometry']):
+            color = ImageColor.getrgb(risk_colors.get(name, 'black'))
+            for polygon in shapely.get_parts(geometry):
+                if polygon.geom_type != 'Polygon':
+                    continue
+                rings = [to_pixels(polygon.exterior.coords)] + [to_pixels(ring.coords) for ring in polygon.interiors]
+                if name in risk_colors:
+                    mask = Image.new('L', image.size, 0)
+                    mask_draw = ImageDraw.Draw(mask)
+                    mask_draw.polygon(rings[0], fill=int(0.3 * 255))
+                    for hole in rings[1:]:
+                        mask_draw.polygon(hole, fill=0)
+                    fill_layer = Image.new('RGBA', image.size, color + (0,))
+                    fill_layer.putalpha(mask)
+                    image = Image.alpha_composite(image, fill_layer)
+                draw = ImageDraw.Draw(image)
+                for ring in rings:
+                    draw.line(ring + ring[:1], fill=color + (255,), width=1 if name in risk_colors else 2)
+    image.save(output_path, 'PNG')
 
 # 8. Overlay Template on Map
-def overlay_on_template(map_image_path, template_image_path, output_path, position=(0, 0)):
-    map_img = Image.open(map_image_path).convert('RGBA')
-    template = Image.open(template_image_path).convert('RGBA')
-    map_img.paste(template, position, template)
-    map_img.save(output_path, 'PNG', quality=100, optimize=False)
+# Only the part of the template that lands on the map canvas is kept. It is cached
+# in memory for the process and as raw RGBA on disk across runs, so the large
+# template PNG is decoded once rather than on every run.
+image_encoders = {
+    'png': ('PNG', {}),
+    'png_fast': ('PNG', {'compress_level': 1}),
+    'png_optimized': ('PNG', {'optimize': True}),
+    'webp': ('WEBP', {'quality': 90, 'method': 4}),
+}
+template_layers = {}
+composite_canvases = {}
+
+def load_template_layer(template_image_path, canvas_size, position, cache_dir="template_cache"):
+    stat = os.stat(template_image_path)
+    key = (os.path.abspath(template_image_path), stat.st_mtime, stat.st_size, tuple(canvas_size), tuple(position))
+    if key in template_layers:
+        return template_layers[key]
+    raw_path = os.path.join(cache_dir, hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:16] + ".rgba")
+    layer = None
+    if os.path.exists(raw_path) and os.path.exists(raw_path + ".json"):
+        try:
+            with open(raw_path + ".json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if all(meta['size']):
+                with open(raw_path, 'rb') as f:
+                    crop = Image.frombuffer('RGBA', tuple(meta['size']), f.read(), 'raw', 'RGBA', 0, 1)
+            else:
+                crop = Image.new('RGBA', tuple(meta['size']))
+            layer = (crop, tuple(meta['dest']))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable template cache: {e}")
+    if layer is None:
+        x, y = position
+        template = Image.open(template_image_path)
+        # Overlap of the template with the canvas, in template coordinates
+        left, top = max(0, -x), max(0, -y)
+        right = max(left, min(template.width, canvas_size[0] - x))
+        bottom = max(top, min(template.height, canvas_size[1] - y))
+        crop = template.crop((left, top, right, bottom)).convert('RGBA')
+        layer = (crop, (x + left, y + top))
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(raw_path, 'wb') as f:
+                f.write(crop.tobytes())
+            with open(raw_path + ".json", 'w', encoding='utf-8') as f:
+                json.dump({'size': crop.size, 'dest': layer[1]}, f)
+        except OSError as e:
+            print(f"Failed to cache template layer: {e}")
+    template_layers[key] = layer
+    return layer
+
+def encode_image(image, output, encoder='png'):
+    image_format, options = image_encoders[encoder]
+    start = time.perf_counter()
+    image.save(output, image_format, **options)
+    return time.perf_counter() - start
+
+def report_encoders(image, encoders=None):
+    report = {}
+    for encoder in encoders or image_encoders:
+        buffer = io.BytesIO()
+        seconds = encode_image(image, buffer, encoder)
+        report[encoder] = {'seconds': seconds, 'bytes': buffer.tell()}
+        print(f"{encoder}: {seconds:.3f}s, {buffer.tell() / 1024:.0f} KB")
+    return report
+
+def overlay_on_template(map_image_path, template_image_path, output_path, position=(0, 0), encoder='png', report=False):
+    map_img = Image.open(map_image_path)
+    canvas = composite_canvases.get(map_img.size)
+    if canvas is None:
+        canvas = composite_canvases[map_img.size] = Image.new('RGBA', map_img.size)
+    canvas.paste(map_img.convert('RGBA'))
+    template, dest = load_template_layer(template_image_path, map_img.size, position)
+    if template.width and template.height:
+        canvas.alpha_composite(template, dest)
+    seconds = encode_image(canvas, output_path, encoder)
+    print(f"Saved {output_path} with {encoder}: {seconds:.3f}s, {os.path.getsize(output_path) / 1024:.0f} KB")
+    if report:
+        return report_encoders(canvas)
 
 def save_interactive_map(map_object, html_output_path, preview_image_name="map_preview.png", 
                         github_repo_url="https://raw.githubusercontent.com/Handry-Outlook/Convective-Outlook/main"):
-    map_object.save(html_output_path)
-    with open(html_output_path, 'r', encoding='utf-8') as f:
-        html_content = f.read()
-    
     # Ensure the preview image is in the repository's root or a subfolder
     preview_image_path = os.path.join(os.path.dirname(html_output_path), preview_image_name)
     
@@ -1085,11 +2721,12 @@ def save_interactive_map(map_object, html_output_path, preview_image_name="map_p
     '''
     # Add the icon image to the body
     icon_html = f'<img src="{icon_image_url}" alt="Handry Outlook Icon" class="handry-icon">'
-    updated_html = html_content.replace('<body>', f'<body>\n{icon_html}')
-    updated_html = updated_html.replace('<head>', f'<head>\n{meta_tags}')
-    
-    with open(html_output_path, 'w', encoding='utf-8') as f:
-        f.write(updated_html)
+    # Inject through folium's element tree so the page is rendered and written once.
+    # Named children replace themselves, so saving the same map twice is safe.
+    root = map_object.get_root()
+    root.header.add_child(folium.Element(meta_tags), name='handry_meta_tags', index=0)
+    root.html.add_child(folium.Element(icon_html), name='handry_icon', index=0)
+    map_object.save(html_output_path)
     
     # Verify the preview image exists and is committed to GitHub
     #if not os.path.exists(preview_image_path):
@@ -1117,10 +2754,33 @@ def run_processing(root, status_label):
     output_map_img = "temp_map.png"
     final_output = "final_output.png"
     interactive_map_html = "interactive_map.html"
+    statistics_json = "outlook_statistics.json"  # Monthly, yearly, weekday, season and duration breakdowns
     discussion_file = "convective_discussions.txt"
     preview_image = "map_preview.png"
+    thumbnail_image = "map_thumbnail.png"
+    outlook_dir = "outlooks"
+    publish_max_zoom = 9  # Highest zoom the published geometry is simplified for; None disables
+    archive_tiles_dir = None  # e.g. "outlook_tiles" to also publish the archive as vector tiles
+    static_renderer = "browser"  # "python" draws the static map without Chrome
+    final_encoder = "png"  # Any key of image_encoders, e.g. "png_fast" to trade file size for speed
+    report_image_encoders = False  # Re-encode the final image with every encoder and print time and size (slow)
+    lightning_archive_url = "lightning_archive"  # Published by lightning_store.py ingest; page falls back to the live feed
+    lightning_feed_url = "lightning_feed"  # Published by lightning_store.py feed; page falls back to full polling
+    lightning_density_url = "lightning_density"  # Published by lightning_store.py density; used above 20000 strikes
+    lightning_url = LIGHTNING_URL  # Or a local strikes.json / stand-in server
+    lightning_binary_url = "strikes.bin"  # Packed by lightning_store.py and committed next to the page by scrape.yml
+    lightning_timeout = 10  # Seconds before the build stops waiting and uses the cached snapshot
+    lightning_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lightning_cache")
+    kml_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kml_cache")
+    outlook_store_path = None  # e.g. "outlooks.sqlite" to keep the parsed archive in SQLite instead of memory
+    ingest_workers = os.cpu_count() or 1  # Set to 1 to parse KMLs serially
 
     current_date = datetime.now()
+    # Runs while the KMLs are ingested; waited on just before the map is built
+    lightning_pool = ThreadPoolExecutor(max_workers=1)
+    lightning_future = lightning_pool.submit(fetch_lightning_snapshot, lightning_url, lightning_cache_dir, lightning_timeout)
+    lightning_pool.shutdown(wait=False)
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
     uk_weather_dir = os.path.dirname(script_dir)
 
@@ -1133,29 +2793,72 @@ def run_processing(root, status_label):
                     kml_files.append(os.path.join(root_dir, f))
 
     # Proceed even if no KMLs
+    outlook_store = None
     if not kml_files:
         all_kmls_data = {}
     else:
         generate_discussion_template(kml_files, discussion_file, root)
         discussions = load_discussions(discussion_file) if os.path.exists(discussion_file) else {}
-        all_kmls_data_raw = {}
-        for kml_path in kml_files:
-            kml = os.path.relpath(kml_path, uk_weather_dir)
-            start, end, version = parse_kml_time(os.path.basename(kml_path))
-            if start and end:
-                kml_data = load_kml(kml_path, discussions)
-                cleaned_data = clean_kml_data(kml_data)
-                all_kmls_data_raw[kml] = (start, end, cleaned_data, version)
-        all_kmls_data = {kml: all_kmls_data_raw[kml] for kml in all_kmls_data_raw}
+        if outlook_store_path:
+            outlook_store = OutlookStore(outlook_store_path)
+            failed_kmls = sync_outlook_store(outlook_store, kml_files, uk_weather_dir, discussions, max_workers=ingest_workers)
+            all_kmls_data = OutlookArchive(outlook_store, discussions)
+        else:
+            all_kmls_data, failed_kmls = load_all_kmls(kml_files, uk_weather_dir, discussions, kml_cache_dir, max_workers=ingest_workers)
+        if failed_kmls:
+            status_label.config(text=f"Skipped {len(failed_kmls)} unreadable KML(s). Continuing...")
+            root.update_idletasks()
 
-    monthly_data, yearly_data = analyze_outlook_data(all_kmls_data)
+    if outlook_store is not None:
+        outlook_catalog = outlook_store.catalog()
+    else:
+        outlook_catalog = build_outlook_catalog(all_kmls_data, kml_cache_dir)
+    write_outlook_catalog(outlook_catalog, os.path.join(outlook_dir, "catalog.json"))
+    date_risk_index = build_date_risk_index(outlook_catalog)
+    monthly_data, yearly_data = analyze_outlook_data(outlook_catalog, date_risk_index, kml_cache_dir)
     create_monthly_chart_html(monthly_data, "monthly_charts.html")
     create_yearly_chart_html(yearly_data, "yearly_charts.html")
+    write_outlook_statistics(get_outlook_statistics(), statistics_json)
 
-    map_obj = create_mapbox_map(all_kmls_data, mapbox_access_token, uk_bounds, current_date)
-    export_map_image(map_obj, output_map_img)
-    overlay_on_template(output_map_img, template_img, final_output, position=(3236, 0))
+    if publish_max_zoom is not None:
+        map_kmls_data = PublishedOutlooks(all_kmls_data, max_zoom=publish_max_zoom,
+                                          outlook_catalog=outlook_catalog, cache_dir=kml_cache_dir)
+    else:
+        map_kmls_data = all_kmls_data
+    archive_tiles_url = None
+    if archive_tiles_dir:
+        export_outlook_mbtiles(map_kmls_data, "outlook_archive.mbtiles")
+        extract_mbtiles("outlook_archive.mbtiles", archive_tiles_dir)
+        archive_tiles_url = archive_tiles_dir.replace(os.sep, '/') + "/{z}/{x}/{y}.pbf"
+    try:
+        lightning_data = lightning_future.result(timeout=lightning_timeout)
+    except FuturesTimeoutError:
+        print("Lightning fetch timed out, using cached snapshot")
+        lightning_data = read_cached_lightning(lightning_url, lightning_cache_dir) or []
+    map_obj = create_mapbox_map(map_kmls_data, mapbox_access_token, uk_bounds, current_date, outlook_dir=outlook_dir,
+                                archive_tiles_url=archive_tiles_url, lightning_archive_url=lightning_archive_url,
+                                lightning_feed_url=lightning_feed_url, lightning_density_url=lightning_density_url,
+                                lightning_url=lightning_url, lightning_data=lightning_data, lightning_binary_url=lightning_binary_url,
+                                outlook_catalog=outlook_catalog, date_risk_index=date_risk_index)
+    if isinstance(map_kmls_data, PublishedOutlooks):
+        print_publish_report(map_kmls_data.stats)
+    # Every static asset is captured from a single page load
+    render_outputs = {
+        'template': (output_map_img, 1360, 1760),
+        'open_graph': (preview_image, 1200, 630),
+        'mobile': (thumbnail_image, 360, 640),
+    }
+    if static_renderer == "python":
+        default_kml, _ = select_default_kml(outlook_catalog, current_date)
+        for output_path, width, height in render_outputs.values():
+            render_static_map(map_kmls_data[default_kml][2] if default_kml else None, output_path, width, height)
+    else:
+        export_map_images(map_obj, render_outputs)
+    overlay_on_template(output_map_img, template_img, final_output, position=(3236, 0),
+                        encoder=final_encoder, report=report_image_encoders)
     save_interactive_map(map_obj, interactive_map_html, preview_image_name=preview_image)
+    if outlook_store is not None:
+        outlook_store.close()
 
     repo_dir = os.path.dirname(os.path.abspath(__file__))
     github_url = f"https://handry-outlook.github.io/Convective-Outlook/{interactive_map_html}"
@@ -1164,8 +2867,13 @@ def run_processing(root, status_label):
         subprocess.run(["git", "add", interactive_map_html], check=True)
         subprocess.run(["git", "add", final_output], check=True)
         subprocess.run(["git", "add", preview_image], check=True)
+        subprocess.run(["git", "add", thumbnail_image], check=True)
+        subprocess.run(["git", "add", "--all", outlook_dir], check=True)
+        if archive_tiles_dir:
+            subprocess.run(["git", "add", "--all", archive_tiles_dir], check=True)
         subprocess.run(["git", "add", "monthly_charts.html"], check=True)
         subprocess.run(["git", "add", "yearly_charts.html"], check=True)
+        subprocess.run(["git", "add", statistics_json], check=True)
         subprocess.run(["git", "commit", "-m", "Update interactive map"], check=True)
         subprocess.run(["git", "push", "origin", "main"], check=True)
         webbrowser.open(github_url)
@@ -1188,7 +2896,22 @@ def main():
     run_btn = ttk.Button(root, text="Run", command=lambda: run_processing(root, status_label))
     run_btn.pack(pady=10)
     
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        if map_renderer is not None:
+            map_renderer.close()
 
 if __name__ == "__main__":
-    main()
+    # python testing3.py benchmark [output.html] writes the lightning window
+    # benchmark page instead of starting the app
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "benchmark":
+        output_path = sys.argv[2] if len(sys.argv) == 3 else "lightning_benchmark.html"
+        write_lightning_benchmark(output_path)
+        print(f"Wrote {output_path}; open it in a browser to time the lightning window lookup")
+    # python testing3.py encoders image.png compares every image encoder on a
+    # finished image
+    elif len(sys.argv) == 3 and sys.argv[1] == "encoders":
+        report_encoders(Image.open(sys.argv[2]).convert('RGBA'))
+    else:
+        main()